@@ -1,9 +1,22 @@
 from helpers.StrategyCoreResolver import StrategyCoreResolver
+from helpers.multicall import Call
 from rich.console import Console
-from brownie import interface
 
 console = Console()
 
+## Strategy getters read once into the wiring, see StrategyCoreResolver.wiring
+WIRED_ADDRESSES = (
+    "crv",
+    "cvx",
+    "wbtc",
+    "ctdl",
+    "booster",
+    "baseRewardsPool",
+    "xCitadelLocker",
+    "citadelTreasury",
+)
+POOL_INFO = "poolInfo(uint256)(address,address,address,address,address,bool)"
+
 
 class StrategyResolver(StrategyCoreResolver):
     def get_strategy_destinations(self):
@@ -11,8 +24,40 @@ class StrategyResolver(StrategyCoreResolver):
         Track balances for all strategy implementations
         (Strategy Must Implement)
         """
-        strategy = self.manager.strategy
-        return {}
+        wiring = self.wiring
+        return {
+            "strategy": self.manager.strategy.address,
+            "baseRewardsPool": wiring["baseRewardsPool"],
+            "xCitadelLocker": wiring["xCitadelLocker"],
+            "citadelTreasury": wiring["citadelTreasury"],
+        }
+
+    def wiring_stages(self):
+        strategy = self.manager.strategy.address
+        return super().wiring_stages() + [
+            lambda values: [
+                Call(strategy, name + "()(address)", [[name, None]])
+                for name in WIRED_ADDRESSES
+            ]
+            + [Call(strategy, "pid()(uint256)", [["pid", None]])],
+            ## poolInfo needs the booster and pid read above
+            lambda values: [
+                Call(
+                    values["booster"],
+                    [POOL_INFO, values["pid"]],
+                    [["lpToken", None], ["convexLpToken", None]],
+                )
+            ],
+        ]
+
+    def wiring_setters(self):
+        setters = super().wiring_setters()
+        setters[self.manager.strategy.address] |= {
+            "setPid",
+            "setXCitadelLocker",
+            "setCitadelTreasury",
+        }
+        return setters
 
     def hook_after_confirm_withdraw(self, before, after, params):
         """
@@ -125,35 +170,15 @@ class StrategyResolver(StrategyCoreResolver):
         """
         assert True
 
-    def add_entity_balances_for_tokens(self, calls, tokenKey, token, entities):
-        entities["strategy"] = self.manager.strategy.address
-        entities["baseRewardsPool"] = self.manager.strategy.baseRewardsPool()
-        entities["xCitadelLocker"] = self.manager.strategy.xCitadelLocker()
-        entities["citadelTreasury"] = self.manager.strategy.citadelTreasury()
-
-        super().add_entity_balances_for_tokens(calls, tokenKey, token, entities)
-        return calls
-
     def add_balances_snap(self, calls, entities):
         super().add_balances_snap(calls, entities)
-        strategy = self.manager.strategy
-
-        crv = interface.IERC20(strategy.crv())
-        cvx = interface.IERC20(strategy.cvx())
-        wbtc = interface.IERC20(strategy.wbtc())
-        ctdl = interface.IERC20(strategy.ctdl())
-
-        ## Get the booster for this strat
-        booster = interface.IBooster(strategy.booster())
-        ## So we can get the lpToken associated
-        convexLpToken = interface.IERC20(booster.poolInfo(strategy.pid())["token"])
+        wiring = self.wiring
 
-        calls = self.add_entity_balances_for_tokens(
-            calls, "convexLpToken", convexLpToken, entities
-        )
-        calls = self.add_entity_balances_for_tokens(calls, "crv", crv, entities)
-        calls = self.add_entity_balances_for_tokens(calls, "cvx", cvx, entities)
-        calls = self.add_entity_balances_for_tokens(calls, "wbtc", wbtc, entities)
-        calls = self.add_entity_balances_for_tokens(calls, "ctdl", ctdl, entities)
+        ## Plain addresses from the wiring, no contract objects per plan build
+        ## convexLpToken is the booster's lpToken for this strat's pid
+        for tokenKey in ("convexLpToken", "crv", "cvx", "wbtc", "ctdl"):
+            calls = self.add_entity_balances_for_tokens(
+                calls, tokenKey, wiring[tokenKey], entities
+            )
 
         return calls
@@ -1,10 +1,21 @@
 from brownie import *
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
 from rich.console import Console
-from helpers.multicall import Multicall
+from helpers.multicall import Call, Multicall, CallPlan
 from helpers.utils import val
 
+from helpers.snapshot.batch import SnapBatch
+from helpers.snapshot.diff import SnapDiff
+from helpers.snapshot.history import MAX_SNAPS, SnapHistory
+from helpers.snapshot.receipt import apply_transfers, derivable_keys
 from helpers.snapshot.snap import Snap
+from helpers.snapshot.store import SnapStore
+from helpers.snapshot.sweep import SnapSweep
 
 from _setup.StrategyResolver import StrategyResolver
 
@@ -12,28 +23,94 @@ console = Console()
 
 
 class SnapshotManager:
-    def __init__(self, sett, strategy, key):
+    def __init__(
+        self,
+        sett,
+        strategy,
+        key,
+        require_success=True,
+        sink=None,
+        transport=None,
+        max_snaps=MAX_SNAPS,
+        spill=None,
+        store=None,
+        incremental=False,
+        cross_check_rate=0.0,
+        mode="full",
+        reads_path=None,
+        render="grid",
+        estimate_gas=False,
+    ):
         self.key = key
+        # When False, reverting calls show up as Failure values instead of failing the snap
+        self.require_success = require_success
+        # Optional metrics sink (helpers.multicall.metrics) for multicall and snap records
+        self.sink = sink
+        # Backend for snapshot calls (helpers.multicall.transport), brownie's web3 if None
+        self.transport = transport
+        # Add each aggregate's eth_estimateGas to the multicall and snapshot records
+        self.estimate_gas = estimate_gas
         self.sett = sett
         self.strategy = strategy
-        self.want = interface.IERC20Detailed(self.sett.token())
-        self.resolver = self.init_resolver(self.strategy.getName())
-        self.snaps = {}
-        self.settSnaps = {}
+        # Setup reads go through the transport too, so sett and strategy only
+        # need an .address to snap contracts deployed on InProcessTransport
+        self.want_address = self.read(self.sett.address, "token()(address)")
+        self._want = None
+        self.resolver = self.init_resolver(
+            self.read(self.strategy.address, "getName()(string)")
+        )
+        # Last max_snaps snaps by (block, seq), older ones dropped or spilled to disk
+        self.snaps = SnapHistory(max_snaps, spill)
+        # Optional SnapStore (or its sqlite path) every snap is also written to
+        self.store = SnapStore(store) if isinstance(store, str) else store
+        # Derive after-snaps from receipts, checking a share of them against full snaps
+        self.incremental = incremental
+        self.cross_check_rate = cross_check_rate
+        # "lazy" snaps only the keys each operation's checks read on earlier runs
+        self.mode = mode
+        self.reads_path = reads_path
+        self.reads = {}
+        if reads_path and os.path.exists(reads_path):
+            with open(reads_path) as f:
+                self.reads = {op: set(keys) for op, keys in json.load(f).items()}
+        # How printCompare renders diffs, "none" skips formatting altogether
+        self.render = render
         self.entities = {}
+        # Compiled call plans, keyed by the tracked entity slots they expose
+        self.plans = {}
 
-        assert self.want == self.strategy.want()
+        assert self.want_address == self.read(self.strategy.address, "want()(address)")
 
         # Common entities for all strategies
         self.addEntity("sett", self.sett.address)
         self.addEntity("strategy", self.strategy.address)
-        self.addEntity("governance", self.strategy.governance())
-        self.addEntity("treasury", self.sett.treasury())
-        self.addEntity("strategist", self.strategy.strategist())
+        self.wire()
+
+    @property
+    def want(self):
+        """
+        brownie contract of the sett's token, only needed to send transactions
+        """
+        if self._want is None:
+            self._want = interface.IERC20Detailed(self.want_address)
+        return self._want
+
+    def read(self, target, function):
+        return Call(target, function)(transport=self.transport)
+
+    def wire(self):
+        """
+        Register the entities read from the resolver's cached wiring
+        """
+        wiring = self.resolver.wiring
+        self.addEntity("governance", wiring["governance"])
+        self.addEntity("treasury", wiring["treasury"])
+        self.addEntity("strategist", wiring["strategist"])
 
         destinations = self.resolver.get_strategy_destinations()
         for key, dest in destinations.items():
             self.addEntity(key, dest)
+        self.wired = wiring
 
     def add_snap_calls(self, entities):
         calls = []
@@ -43,30 +120,243 @@ class SnapshotManager:
         calls = self.resolver.add_strategy_snap(calls, entities=entities)
         return calls
 
-    def snap(self, trackedUsers=None):
-        print("snap")
-        snapBlock = chain.height
-        entities = self.entities
+    def get_plan(self, slots):
+        # A setter call re-reads the wiring, rebuild the plans on the new addresses
+        if self.resolver.wiring is not self.wired:
+            self.wire()
+        slots = tuple(sorted(slots))
+        if slots not in self.plans:
+            self.plans[slots] = CallPlan(
+                lambda slotEntities: self.add_snap_calls(
+                    {**self.entities, **slotEntities}
+                ),
+                slots,
+            )
+        return self.plans[slots]
+
+    def block_number(self):
+        return self.transport.block_number() if self.transport else chain.height
+
+    def entity_keys(self, trackedUsers):
+        return list(self.entities.keys()) + [
+            key for key in trackedUsers.keys() if key not in self.entities
+        ]
+
+    def record(self, snap):
+        self.snaps.add(snap)
+        if self.store is not None:
+            self.store.add(self.key, snap)
+        return snap
+
+    def snap_keys(self, op):
+        """
+        Keys to snap for an operation, None for all of them
+        """
+        if self.mode != "lazy" or op not in self.reads:
+            return None
+        return self.reads[op]
+
+    def multicall(self, calls, block, **kwargs):
+        return Multicall(
+            calls,
+            require_success=self.require_success,
+            block_identifier=block,
+            sink=self.sink,
+            transport=self.transport,
+            estimate_gas=self.estimate_gas,
+            **kwargs,
+        )
 
-        if trackedUsers:
-            for key, user in trackedUsers.items():
-                entities[key] = user
+    def emit_snapshot(self, multi, data, block, start, **fields):
+        """
+        Snapshot record for the sink, next to the multicall record of the same run
+        """
+        if self.sink is None:
+            return
+        record = {
+            "event": "snapshot",
+            "vault": self.key,
+            "block": block,
+            "calls": len(multi.calls),
+            "keys": len(data),
+            **fields,
+            "wall_time": time.perf_counter() - start,
+        }
+        if self.estimate_gas:
+            record["gas_used"] = multi.metrics.get("gas_used", 0)
+        self.sink.emit(record)
+
+    def snap_calls(self, trackedUsers, keys=None):
+        calls = self.get_plan(trackedUsers.keys()).bind(trackedUsers)
+        if keys is None:
+            return calls
+        return [
+            call
+            for call in calls
+            if any(name in keys for name, handler in call.returns or [])
+        ]
+
+    def fetch_key(self, key, block, trackedUsers):
+        """
+        Value of a key a lazy snap was taken without, read at the snap's block
+        """
+        calls = [
+            call
+            for call in self.snap_calls(trackedUsers)
+            if any(name == key for name, handler in call.returns or [])
+        ]
+        if not calls:
+            raise Exception("Key {} not found in snap data".format(key))
+        return self.multicall(calls, block)()[key]
+
+    def make_snap(self, data, block, trackedUsers):
+        if self.mode != "lazy":
+            return Snap(data, block, self.entity_keys(trackedUsers))
+        return Snap(
+            data,
+            block,
+            self.entity_keys(trackedUsers),
+            reads=set(),
+            fetch=lambda key: self.fetch_key(key, block, trackedUsers),
+        )
 
-        calls = self.add_snap_calls(entities)
-        multi = Multicall(calls)
+    def learn(self, op, *snaps):
+        """
+        Remember the keys an operation's checks read, for later lazy snaps
+        """
+        if self.mode != "lazy":
+            return
+        keys = self.reads.setdefault(op, set())
+        for snap in snaps:
+            keys |= snap.reads or set()
+        if self.reads_path:
+            with open(self.reads_path, "w") as f:
+                json.dump(
+                    {op: sorted(keys) for op, keys in self.reads.items()}, f, indent=2
+                )
+
+    def snap(self, trackedUsers=None, op=None):
+        print("snap")
+        start = time.perf_counter()
+        snapBlock = self.block_number()
+        trackedUsers = trackedUsers or {}
+
+        multi = self.multicall(
+            self.snap_calls(trackedUsers, self.snap_keys(op)), snapBlock
+        )
         # multi.printCalls()
 
         data = multi()
-        self.snaps[snapBlock] = Snap(
-            data,
+        self.emit_snapshot(multi, data, snapBlock, start)
+        return self.record(self.make_snap(data, snapBlock, trackedUsers))
+
+    def after(self, before, tx, trackedUsers=None, op=None):
+        """
+        Snap following tx, taken right after it was mined
+        In incremental mode ERC20 balances and totalSupply are derived from the
+        receipt's Transfer logs and only the other keys are queried. A full snap
+        is taken instead when tx isn't the only transaction since before.
+        """
+        if not self.incremental or tx is None:
+            return self.snap(trackedUsers, op)
+        snapBlock = self.block_number()
+        if not (snapBlock == tx.block_number == before.block + 1):
+            return self.snap(trackedUsers, op)
+
+        print("snap (incremental)")
+        start = time.perf_counter()
+        trackedUsers = trackedUsers or {}
+        calls = self.snap_calls(trackedUsers, self.snap_keys(op))
+        balances, supplies = derivable_keys(calls)
+        derived = set(balances.values()) | set(supplies.values())
+        # Failures (or a before snap of other users) can't be carried forward
+        if not all(type(before.data.get(key)) is int for key in derived):
+            return self.snap(trackedUsers, op)
+
+        multi = self.multicall(
+            [
+                call
+                for call in calls
+                if not call.uint256_key or call.uint256_key[0] not in derived
+            ],
             snapBlock,
-            [x[0] for x in entities.items()],
+        )
+        queried = multi()
+        values = {**queried, **apply_transfers(before, tx.logs, balances, supplies)}
+        # Same key order as a full snap, so both share one schema
+        data = {key: values[key] for key in before.data if key in values}
+        data.update(values)
+        self.emit_snapshot(multi, data, snapBlock, start, derived=len(derived))
+        after = self.make_snap(data, snapBlock, trackedUsers)
+
+        if self.cross_check_rate and random.random() < self.cross_check_rate:
+            full = self.snap(trackedUsers, op)
+            mismatched = [key for key in derived if after.data[key] != full.data[key]]
+            if mismatched:
+                raise Exception(
+                    "Receipt-derived snap differs from chain at block {}: {}".format(
+                        snapBlock, mismatched
+                    )
+                )
+            return full
+        return self.record(after)
+
+    def sweep(self, blocks, keys=None, trackedUsers=None, max_workers=8, cache=None):
+        """
+        Run the snap plan over a block range or list of blocks
+        e.g. for row in manager.sweep(range(start, end, 100), ["sett.getPricePerFullShare"])
+        """
+        trackedUsers = trackedUsers or {}
+        plan = self.get_plan(trackedUsers.keys())
+        return SnapSweep(
+            plan.bind(trackedUsers),
+            blocks,
+            keys=keys,
+            max_workers=max_workers,
+            require_success=self.require_success,
+            cache=cache,
+            sink=self.sink,
+            transport=self.transport,
+            estimate_gas=self.estimate_gas,
         )
 
-        return self.snaps[snapBlock]
+    def what_if(self, variants, trackedUsers=None, max_workers=8):
+        """
+        Snap the current block under each of many eth_call state overrides
+        variants maps a name to an override set, returns {name: Snap}
+        e.g. manager.what_if({"more_want": {want: {"stateDiff": {
+            mapping_slot(strategy, 0): amount}}}})
+        Read-only, nothing is mined and the snaps are not added to self.snaps.
+        Needs a node that supports the override set (geth, erigon, anvil).
+        """
+        snapBlock = self.block_number()
+        trackedUsers = trackedUsers or {}
+        calls = self.get_plan(trackedUsers.keys()).bind(trackedUsers)
+        entityKeys = self.entity_keys(trackedUsers)
+
+        def run(override):
+            data = self.multicall(
+                calls, snapBlock, state_override=override, max_workers=1
+            )()
+            return Snap(data, snapBlock, entityKeys)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(run, override)
+                for name, override in variants.items()
+            }
+        return {name: future.result() for name, future in futures.items()}
+
+    def batch(self, confirm=True):
+        """
+        Context queueing many users' deposits / withdrawals, snapped and checked
+        once for the whole batch, see helpers.snapshot.batch.SnapBatch
+        """
+        return SnapBatch(self, confirm)
 
     def addEntity(self, key, entity):
         self.entities[key] = entity
+        self.plans = {}
 
     def init_resolver(self, name):
         print("init_resolver", name)
@@ -75,77 +365,84 @@ class SnapshotManager:
     def settTend(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "tend")
         tx = self.strategy.tend(overrides)
-        after = self.snap(trackedUsers)
+        after = self.after(before, tx, trackedUsers, "tend")
         if confirm:
             self.resolver.confirm_tend(before, after, tx)
+            self.learn("tend", before, after)
 
     def settHarvest(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "harvest")
         tx = self.strategy.harvest(overrides)
-        after = self.snap(trackedUsers)
+        after = self.after(before, tx, trackedUsers, "harvest")
         if confirm:
             self.resolver.confirm_harvest(before, after, tx)
+            self.learn("harvest", before, after)
 
     def settDeposit(self, amount, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        self.sett.deposit(amount, overrides)
-        after = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "deposit")
+        tx = self.sett.deposit(amount, overrides)
+        after = self.after(before, tx, trackedUsers, "deposit")
 
         if confirm:
             self.resolver.confirm_deposit(
                 before, after, {"user": user, "amount": amount}
             )
+            self.learn("deposit", before, after)
 
     def settDepositAll(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
         userBalance = self.want.balanceOf(user)
-        before = self.snap(trackedUsers)
-        self.sett.depositAll(overrides)
-        after = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "deposit")
+        tx = self.sett.depositAll(overrides)
+        after = self.after(before, tx, trackedUsers, "deposit")
         if confirm:
             self.resolver.confirm_deposit(
                 before, after, {"user": user, "amount": userBalance}
             )
+            self.learn("deposit", before, after)
 
     def settEarn(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        self.sett.earn(overrides)
-        after = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "earn")
+        tx = self.sett.earn(overrides)
+        after = self.after(before, tx, trackedUsers, "earn")
         if confirm:
             self.resolver.confirm_earn(before, after, {"user": user})
+            self.learn("earn", before, after)
 
     def settWithdraw(self, amount, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "withdraw")
         tx = self.sett.withdraw(amount, overrides)
-        after = self.snap(trackedUsers)
+        after = self.after(before, tx, trackedUsers, "withdraw")
         if confirm:
             self.resolver.confirm_withdraw(
                 before, after, {"user": user, "amount": amount}, tx
             )
+            self.learn("withdraw", before, after)
 
     def settWithdrawAll(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
         userBalance = self.sett.balanceOf(user)
-        before = self.snap(trackedUsers)
+        before = self.snap(trackedUsers, "withdraw")
         tx = self.sett.withdraw(userBalance, overrides)
-        after = self.snap(trackedUsers)
+        after = self.after(before, tx, trackedUsers, "withdraw")
 
         if confirm:
             self.resolver.confirm_withdraw(
                 before, after, {"user": user, "amount": userBalance}, tx
             )
+            self.learn("withdraw", before, after)
 
     def format(self, key, value):
         if type(value) is int:
@@ -162,42 +459,25 @@ class SnapshotManager:
                 return val(value)
         return value
 
-    def diff(self, a, b):
-        if type(a) is int and type(b) is int:
-            return b - a
-        else:
-            return "-"
+    def compare(self, before: Snap, after: Snap):
+        return SnapDiff(before, after)
 
-    def printCompare(self, before: Snap, after: Snap):
+    def printCompare(self, before: Snap, after: Snap, render=None):
+        """
+        Diff of the two snaps, rendered as self.render unless told otherwise:
+        "grid" (formatted table), "jsonl" (raw values) or "none"
+        """
         # self.printPermissions()
-        table = []
-        console.print(
-            "[green]=== Compare: {} Sett {} -> {} ===[/green]".format(
-                self.key, before.block, after.block
-            )
-        )
-
-        for key, item in before.data.items():
-
-            a = item
-            b = after.get(key)
-
-            # Don't add items that don't change
-            if a != b:
-                table.append(
-                    [
-                        key,
-                        self.format(key, a),
-                        self.format(key, b),
-                        self.format(key, self.diff(a, b)),
-                    ]
+        render = render or self.render
+        diff = self.compare(before, after)
+        if render == "grid":
+            console.print(
+                "[green]=== Compare: {} Sett {} -> {} ===[/green]".format(
+                    self.key, before.block, after.block
                 )
-
-        print(
-            tabulate(
-                table, headers=["metric", "before", "after", "diff"], tablefmt="grid"
             )
-        )
+        diff.render(render, format=self.format)
+        return diff
 
     def printPermissions(self):
         # Accounts
@@ -12,6 +12,7 @@ from helpers.utils import (
 )
 from helpers.constants import *
 from helpers.multicall import Call, as_wei, func
+from helpers.snapshot.wiring import Wiring
 from rich.console import Console
 
 console = Console()
@@ -20,14 +21,58 @@ console = Console()
 class StrategyCoreResolver:
     def __init__(self, manager):
         self.manager = manager
+        self._wiring = None
+
+    # ===== Strategy wiring =====
+
+    def wiring_stages(self):
+        """
+        Addresses read once per wiring, as Wiring stages
+        Extend to add strategy specific ones
+        """
+        sett = self.manager.sett
+        strategy = self.manager.strategy
+        return [
+            lambda values: [
+                Call(strategy.address, [func.sett.governance], [["governance", None]]),
+                Call(strategy.address, [func.sett.strategist], [["strategist", None]]),
+                Call(sett.address, "treasury()(address)", [["treasury", None]]),
+            ]
+        ]
+
+    def wiring_setters(self):
+        """
+        {address: {function names}} whose calls change the wiring
+        """
+        return {
+            self.manager.strategy.address: set(),
+            # strategy.governance() and strategist() read through to the vault
+            self.manager.sett.address: {
+                "setGovernance",
+                "setStrategist",
+                "setTreasury",
+            },
+        }
+
+    @property
+    def wiring(self):
+        if self._wiring is None:
+            self._wiring = Wiring(
+                self.wiring_stages(),
+                self.wiring_setters(),
+                transport=self.manager.transport,
+            )
+        return self._wiring.get()
 
     # ===== Read strategy data =====
 
     def add_entity_shares_for_tokens(self, calls, tokenKey, token, entities):
+        # token is a brownie contract or a plain address
+        address = getattr(token, "address", token)
         for entityKey, entity in entities.items():
             calls.append(
                 Call(
-                    token.address,
+                    address,
                     [func.digg.sharesOf, entity],
                     [["shares." + tokenKey + "." + entityKey, as_wei]],
                 )
@@ -36,10 +81,12 @@ class StrategyCoreResolver:
         return calls
 
     def add_entity_balances_for_tokens(self, calls, tokenKey, token, entities):
+        # token is a brownie contract or a plain address
+        address = getattr(token, "address", token)
         for entityKey, entity in entities.items():
             calls.append(
                 Call(
-                    token.address,
+                    address,
                     [func.erc20.balanceOf, entity],
                     [["balances." + tokenKey + "." + entityKey, as_wei]],
                 )
@@ -48,8 +95,8 @@ class StrategyCoreResolver:
         return calls
 
     def add_balances_snap(self, calls, entities):
-        want = self.manager.want
-        sett = self.manager.sett
+        want = self.manager.want_address
+        sett = self.manager.sett.address
 
         calls = self.add_entity_balances_for_tokens(calls, "want", want, entities)
         calls = self.add_entity_balances_for_tokens(calls, "sett", sett, entities)
@@ -2,9 +2,14 @@
 Inlined version of bantegs' multicall.py for brownie compatibility
 https://github.com/banteg/multicall.py
 """
+
 __version__ = "0.1.1"
 
-from helpers.multicall.signature import Signature
+from helpers.multicall.signature import Signature, get_signature, signature_cache_info
 from helpers.multicall.call import Call
-from helpers.multicall.multicall import Multicall
+from helpers.multicall.multicall import Multicall, Failure
 from helpers.multicall.functions import func, as_wei
+from helpers.multicall.cache import ResponseCache
+from helpers.multicall.plan import CallPlan
+from helpers.multicall.fleet import Fleet
+from helpers.multicall.tuning import ChunkTuner
@@ -0,0 +1,257 @@
+import asyncio
+import time
+from collections import deque
+
+import aiohttp
+from brownie import web3
+from hexbytes import HexBytes
+
+from helpers.multicall.metrics import Timer
+from helpers.multicall.multicall import Multicall, halves
+from helpers.multicall.transport import (
+    JSONRPCClient,
+    call_params,
+    estimate_gas_params,
+    parse_batch,
+    parse_response,
+)
+
+## Upper bound on in-flight eth_calls shared by every plan using the same AsyncRPC
+MAX_CONCURRENCY = 16
+REQUEST_TIMEOUT = 30
+
+
+class AsyncRPC(JSONRPCClient):
+    """
+    Pooled JSON-RPC client for an asyncio event loop
+    Share one instance between AsyncMulticalls so they share its connection pool
+    and concurrency limit, and close() it when done
+    """
+
+    def __init__(
+        self,
+        endpoint_uri=None,
+        max_concurrency=MAX_CONCURRENCY,
+        timeout=REQUEST_TIMEOUT,
+    ):
+        super().__init__()
+        self.endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.session = None
+        self._semaphore = None
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def send(self, payload):
+        await self.open()
+        async with self._semaphore:
+            return await asyncio.wait_for(self._post(payload), timeout=self.timeout)
+
+    async def request(self, method, params):
+        return parse_response(await self.send(self.payload(method, params)))
+
+    async def _post(self, payload):
+        async with self.session.post(self.endpoint_uri, json=payload) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = int(await self.request("eth_chainId", []), 16)
+        return self._chain_id
+
+    async def block_number(self):
+        return int(await self.request("eth_blockNumber", []), 16)
+
+    async def has_code(self, address):
+        if address not in self._code:
+            code = await self.request("eth_getCode", [address, "latest"])
+            self._code[address] = len(HexBytes(code)) > 0
+        return self._code[address]
+
+    async def eth_call(self, tx, block_identifier=None, state_override=None):
+        return HexBytes(
+            await self.request(
+                "eth_call", call_params(tx, block_identifier, state_override)
+            )
+        )
+
+    async def estimate_gas(self, tx, block_identifier=None):
+        return int(
+            await self.request(
+                "eth_estimateGas", estimate_gas_params(tx, block_identifier)
+            ),
+            16,
+        )
+
+    async def batch_call(self, txs, block_identifier=None, state_override=None):
+        payload = self.batch_payload(txs, block_identifier, state_override)
+        return parse_batch(payload, await self.send(payload))
+
+
+class AsyncMulticall(Multicall):
+    """
+    Multicall that awaits its chunks on an event loop instead of a thread pool
+    Usage: await AsyncMulticall(calls, rpc)()
+    Without an rpc, each run opens its own AsyncRPC and closes it when done.
+    Chunking, tuning, bisection, caching and decoding are Multicall's, only
+    the requests are awaited here.
+    """
+
+    def __init__(self, calls, rpc=None, **kwargs):
+        super().__init__(calls, **kwargs)
+        self.owns_rpc = rpc is None
+        self.rpc = rpc or AsyncRPC()
+
+    @property
+    def endpoint(self):
+        return self.rpc.endpoint_uri
+
+    async def aggregator(self, chain_id):
+        for aggregator in self.aggregator_candidates(chain_id):
+            if await self.rpc.has_code(aggregator.target):
+                return aggregator
+        return None
+
+    async def pin_block(self, chunks):
+        if self.block_identifier is None and len(chunks) > 1:
+            return await self.rpc.block_number()
+        return self.block_identifier
+
+    async def fetch(self, aggregator, calls):
+        txs = self.prepare(aggregator, calls)
+        with self.timer.time("rpc_time"):
+            if aggregator is None:
+                response = await self.rpc.batch_call(
+                    txs, self.block_identifier, self.state_override
+                )
+            else:
+                response = await self.rpc.eth_call(
+                    txs[0], self.block_identifier, self.state_override
+                )
+        if aggregator is not None and self.estimate_gas:
+            self.timer.add(
+                "gas_used", await self.rpc.estimate_gas(txs[0], self.block_identifier)
+            )
+        return self.finish(aggregator, response, calls)
+
+    async def fetch_adaptive(self, aggregator, calls, attempt=0):
+        if self.tuner is None:
+            return await self.fetch(aggregator, calls)
+        start = time.perf_counter()
+        try:
+            pairs = await self.fetch(aggregator, calls)
+        except Exception as e:
+            retry = self.retry(calls, e, attempt)
+            if retry is None:
+                raise
+            delay, parts = retry
+            await asyncio.sleep(delay)
+            return await self.gather(
+                self.fetch_adaptive(aggregator, part, attempt + 1) for part in parts
+            )
+        self.record_latency(calls, start)
+        return pairs
+
+    async def fetch_chunk(self, aggregator, calls):
+        try:
+            return await self.fetch_adaptive(aggregator, calls)
+        except Exception as e:
+            if not self.bisects(calls, e):
+                raise
+            if len(calls) == 1:
+                return [(False, str(e))]
+            return await self.gather(
+                self.fetch_chunk(aggregator, part) for part in halves(calls)
+            )
+
+    async def gather(self, fetches):
+        outputs = await asyncio.gather(*fetches)
+        return [pair for output in outputs for pair in output]
+
+    async def __call__(self):
+        start = time.perf_counter()
+        self.timer = Timer()
+        block_identifier = self.block_identifier
+        try:
+            chain_id = await self.rpc.chain_id()
+            aggregator = await self.aggregator(chain_id)
+            pairs, pending = self.lookup(chain_id)
+            chunks = self.chunks([self.unique_calls[index] for index in pending])
+            self.block_identifier = await self.pin_block(chunks)
+            outputs = await asyncio.gather(
+                *[self.fetch_chunk(aggregator, calls) for calls in chunks]
+            )
+            return self.complete(chain_id, aggregator, pairs, pending, outputs, start)
+        finally:
+            self.block_identifier = block_identifier
+            if self.owns_rpc:
+                await self.rpc.close()
+
+    async def resolve(self, chain_id, aggregator, calls):
+        pairs, pending = self.lookup(chain_id, calls)
+        if not pending:
+            return pairs, 0
+        outputs = [
+            await self.fetch_chunk(aggregator, [calls[index] for index in pending])
+        ]
+        pairs = self.store(chain_id, pairs, pending, outputs, calls)
+        return pairs, len(calls) - len(pending)
+
+    async def stream(self):
+        """
+        Async iterator of decoded (key, value) pairs, chunk by chunk
+        Usage: async for key, value in AsyncMulticall(calls, rpc).stream()
+        """
+        start = time.perf_counter()
+        self.timer = Timer()
+        callers = self.callers()
+        chunks = cache_hits = 0
+        block_identifier = self.block_identifier
+        pending = deque()
+        try:
+            chain_id = await self.rpc.chain_id()
+            aggregator = await self.aggregator(chain_id)
+            self.block_identifier = await self.pin_block(self.chunks())
+            for offset, calls in self.indexed_chunks():
+                chunks += 1
+                task = asyncio.ensure_future(self.resolve(chain_id, aggregator, calls))
+                pending.append((offset, task))
+                if len(pending) < self.in_flight():
+                    continue
+                offset, task = pending.popleft()
+                pairs, hits = await task
+                cache_hits += hits
+                for item in self.items(callers, offset, pairs):
+                    yield item
+            while pending:
+                offset, task = pending.popleft()
+                pairs, hits = await task
+                cache_hits += hits
+                for item in self.items(callers, offset, pairs):
+                    yield item
+            self.report(aggregator, chunks, cache_hits, start)
+        finally:
+            # Consumer stopped early, don't fetch chunks nobody will read
+            for offset, task in pending:
+                task.cancel()
+            self.block_identifier = block_identifier
+            if self.owns_rpc:
+                await self.rpc.close()
@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from helpers.multicall.signature import CacheStats
+
+MAX_SIZE = 100_000
+
+
+class ResponseCache:
+    """
+    LRU of raw call results keyed by (chainId, block, target, calldata)
+    Only results for pinned block numbers are stored, as those never change.
+    NOTE: a dev chain that is reverted (chain.revert()) reuses block numbers,
+    call clear() after reverting.
+    Pass a path to persist entries in a sqlite file between runs.
+    Safe to share between the worker threads of a Multicall or a sweep.
+    """
+
+    def __init__(self, max_size=MAX_SIZE, max_age=None, path=None):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, success INTEGER, output BLOB, created REAL)"
+            )
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, record=False) is not None
+
+    @staticmethod
+    def encode_key(key):
+        chain_id, block, target, calldata = key
+        return "{}:{}:{}:{}".format(chain_id, block, target, bytes(calldata).hex())
+
+    def expired(self, created, now=None):
+        return (
+            self.max_age is not None and (now or time.time()) - created > self.max_age
+        )
+
+    def get(self, key, record=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.expired(entry[0]):
+                self._entries.pop(key, None)
+                self._delete_persisted(key)
+                entry = None
+            if entry is None:
+                if record:
+                    self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if record:
+                self.stats.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, success, output):
+        created = time.time()
+        with self._lock:
+            self._entries[key] = (created, success, bytes(output))
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (self.encode_key(key), int(success), bytes(output), created),
+                )
+            while len(self._entries) > self.max_size:
+                oldest, _ = self._entries.popitem(last=False)
+                self._delete_persisted(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._delete_persisted(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def flush(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _delete_persisted(self, key):
+        # Callers hold self._lock
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE key = ?", (self.encode_key(key),)
+            )
+
+    def _load(self):
+        if self.max_age is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self.max_age,),
+            )
+        self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+            (self.max_size,),
+        )
+        rows = self._db.execute(
+            "SELECT key, success, output, created FROM responses ORDER BY created"
+        ).fetchall()
+        for encoded, success, output, created in rows:
+            chain_id, block, target, calldata = encoded.split(":")
+            key = (int(chain_id), int(block), target, bytes.fromhex(calldata))
+            self._entries[key] = (created, bool(success), output)
+        self._db.commit()
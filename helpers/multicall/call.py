@@ -1,23 +1,35 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/call.py
 from eth_utils import to_checksum_address
-from brownie import web3
-from helpers.multicall import Signature
+from helpers.multicall.signature import get_signature
+from helpers.multicall.transport import get_default_transport
 
 
 class Call:
-    def __init__(self, target, function, returns=None):
+    def __init__(self, target, function, returns=None, allow_failure=None):
         self.target = to_checksum_address(target)
         if isinstance(function, list):
             self.function, *self.args = function
         else:
             self.function = function
             self.args = None
-        self.signature = Signature(self.function)
+        self.signature = get_signature(self.function)
         self.returns = returns
+        # None defers to the Multicall's require_success setting
+        self.allow_failure = allow_failure
+        # (name, handler) when the result can be decoded straight from one word
+        self.uint256_key = (
+            returns[0]
+            if self.signature.single_uint256 and returns and len(returns) == 1
+            else None
+        )
+        self._data = None
 
     @property
     def data(self):
-        return self.signature.encode_data(self.args)
+        # Args are fixed at construction, so calldata only needs encoding once
+        if self._data is None:
+            self._data = self.signature.encode_data(self.args)
+        return self._data
 
     def decode_output(self, output):
         decoded = self.signature.decode_data(output)
@@ -29,8 +41,9 @@ class Call:
         else:
             return decoded if len(decoded) > 1 else decoded[0]
 
-    def __call__(self, args=None):
-        args = args or self.args
-        calldata = self.signature.encode_data(args)
-        output = web3.eth.call({"to": self.target, "data": calldata})
+    def __call__(self, args=None, block_identifier=None, transport=None):
+        calldata = self.signature.encode_data(args) if args else self.data
+        output = (transport or get_default_transport()).eth_call(
+            {"to": self.target, "data": calldata}, block_identifier
+        )
         return self.decode_output(output)
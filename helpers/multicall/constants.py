@@ -29,3 +29,16 @@ MULTICALL_ADDRESSES = {
     Network.Arbitrum: "0x7A7443F8c577d537f1d8cD4a629d40a3148Dd7ee",
     Network.Hardhat: "0x7A7443F8c577d537f1d8cD4a629d40a3148Dd7ee",
 }
+
+## Multicall2 adds tryAggregate(bool,(address,bytes)[])
+MULTICALL2_ADDRESSES = {
+    Network.Mainnet: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Kovan: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Rinkeby: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Görli: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Forknet: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+}
+
+## Multicall3 is deployed at the same address on every supported chain
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ADDRESSES = {network: MULTICALL3_ADDRESS for network in Network}
@@ -0,0 +1,98 @@
+"""
+Zero-copy decoders for aggregator return data
+Elements are memoryview slices into the eth_call response, avoiding the
+per-element frames eth_abi allocates when decoding bytes[]
+"""
+
+from functools import lru_cache
+
+from_bytes = int.from_bytes
+WORD_LENGTH = (32).to_bytes(32, "big")
+
+
+@lru_cache(maxsize=64)
+def uniform_heads(length):
+    """
+    Head of a bytes[] whose elements are all exactly one word long
+    """
+    return b"".join(
+        (32 * length + 64 * index).to_bytes(32, "big") for index in range(length)
+    )
+
+
+def array_bounds(view, head):
+    """
+    Start and length of the bytes[] whose offset word sits at head, checked
+    against the response size so a short or empty response raises ValueError
+    instead of decoding to garbage
+    """
+    size = len(view)
+    if size < 64:
+        raise ValueError("response too short: {} bytes".format(size))
+    array = from_bytes(view[head : head + 32], "big")
+    if array + 32 > size:
+        raise ValueError("array offset out of range")
+    length = from_bytes(view[array : array + 32], "big")
+    base = array + 32
+    if base + 32 * length > size:
+        raise ValueError("array length out of range")
+    return base, length
+
+
+def word_elements(view, base, length):
+    """
+    Elements of a bytes[] of single words, or None when the layout isn't uniform
+    """
+    first = base + 32 * length
+    end = first + 64 * length
+    if len(view) < end or view[base:first].tobytes() != uniform_heads(length):
+        return None
+    # Every length word must read 32, checked one byte column at a time
+    data = view[first:end].tobytes()
+    for column in range(32):
+        if data[column::64] != WORD_LENGTH[column : column + 1] * length:
+            return None
+    return [view[start : start + 32] for start in range(first + 32, end, 64)]
+
+
+def decode_aggregate(output):
+    """
+    aggregate((address,bytes)[]) -> (uint256 blockNumber, bytes[] returnData)
+    """
+    view = memoryview(output)
+    size = len(view)
+    base, length = array_bounds(view, 32)
+    block = from_bytes(view[0:32], "big")
+
+    outputs = word_elements(view, base, length)
+    if outputs is not None:
+        return block, outputs
+
+    outputs = []
+    for head in range(base, base + 32 * length, 32):
+        start = base + from_bytes(view[head : head + 32], "big") + 32
+        end = start + from_bytes(view[start - 32 : start], "big")
+        if end > size:
+            raise ValueError("bytes out of range")
+        outputs.append(view[start:end])
+    return block, outputs
+
+
+def decode_results(output):
+    """
+    aggregate3 / tryAggregate -> (bool success, bytes returnData)[]
+    """
+    view = memoryview(output)
+    size = len(view)
+    base, length = array_bounds(view, 0)
+    results = []
+    for head in range(base, base + 32 * length, 32):
+        item = base + from_bytes(view[head : head + 32], "big")
+        if item + 64 > size:
+            raise ValueError("tuple out of range")
+        start = item + from_bytes(view[item + 32 : item + 64], "big") + 32
+        end = start + from_bytes(view[start - 32 : start], "big")
+        if end > size:
+            raise ValueError("bytes out of range")
+        results.append((view[item + 31] != 0, view[start:end]))
+    return results
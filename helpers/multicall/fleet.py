@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.multicall.multicall import Multicall
+from helpers.multicall.transport import HTTPTransport
+
+
+class Fleet:
+    """
+    Runs per-chain call plans concurrently, each chain over its own transport
+    transports maps a chain (e.g. Network.Mainnet) to a transport or an RPC uri
+    fleet({Network.Mainnet: calls, Network.Polygon: calls}) returns one dict
+    keyed by (chain, key), in the time of the slowest chain
+    """
+
+    def __init__(self, transports, raise_on_error=True, **multicall_kwargs):
+        self.transports = {
+            chain: (
+                HTTPTransport.shared(transport)
+                if isinstance(transport, str)
+                else transport
+            )
+            for chain, transport in transports.items()
+        }
+        self.raise_on_error = raise_on_error
+        self.multicall_kwargs = multicall_kwargs
+        # Chains whose plan failed on the last run, when raise_on_error is False
+        self.errors = {}
+
+    def run_chain(self, chain, calls):
+        if chain not in self.transports:
+            raise Exception("No transport configured for chain {}".format(chain))
+        return Multicall(
+            calls, transport=self.transports[chain], **self.multicall_kwargs
+        )()
+
+    def __call__(self, plans):
+        self.errors = {}
+        if not plans:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(plans)) as executor:
+            futures = {
+                chain: executor.submit(self.run_chain, chain, calls)
+                for chain, calls in plans.items()
+            }
+
+        result = {}
+        for chain, future in futures.items():
+            try:
+                data = future.result()
+            except Exception as e:
+                if self.raise_on_error:
+                    raise
+                self.errors[chain] = e
+                continue
+            for key, value in data.items():
+                result[(chain, key)] = value
+        return result
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+## Numeric fields that identify a record rather than measure it
+LABEL_FIELDS = ("block",)
+
+
+class MemorySink:
+    """
+    Keeps every record in a list, handy for asserting on metrics in tests
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records = []
+
+
+class JSONLSink:
+    """
+    Appends one JSON object per record to a file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+class PrometheusSink:
+    """
+    Sums numeric fields into counters named <event>_<field>_total
+    render() returns the text exposition format, write() dumps it to a file
+    (e.g. for node_exporter's textfile collector)
+    """
+
+    def __init__(self, prefix="badger", path=None):
+        self.prefix = prefix
+        self.path = path
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        event = record.get("event", "event")
+        with self._lock:
+            name = "{}_{}_total".format(self.prefix, event)
+            self.counters[name] = self.counters.get(name, 0) + 1
+            for field, value in record.items():
+                if field in LABEL_FIELDS or isinstance(value, bool):
+                    continue
+                if not isinstance(value, (int, float)):
+                    continue
+                name = "{}_{}_{}_total".format(self.prefix, event, field)
+                self.counters[name] = self.counters.get(name, 0) + value
+        if self.path:
+            self.write(self.path)
+
+    def render(self):
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        with open(path or self.path, "w") as f:
+            f.write(self.render())
+
+
+class Timer:
+    """
+    Accumulates named durations and counters, safe to share between threads
+    """
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def add(self, field, amount):
+        with self._lock:
+            self.values[field] = self.values.get(field, 0) + amount
+
+    def time(self, field):
+        return _Span(self, field)
+
+
+class _Span:
+    def __init__(self, timer, field):
+        self.timer = timer
+        self.field = field
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.field, time.perf_counter() - self.start)
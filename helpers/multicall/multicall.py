@@ -1,18 +1,168 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/multicall.py
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
-from brownie import web3
-
 from helpers.multicall import Call
-from helpers.multicall.constants import MULTICALL_ADDRESSES
+from helpers.multicall.constants import (
+    MULTICALL_ADDRESSES,
+    MULTICALL2_ADDRESSES,
+    MULTICALL3_ADDRESSES,
+)
+from helpers.multicall.decoding import (
+    decode_aggregate,
+    decode_results,
+    from_bytes,
+)
+from helpers.multicall.metrics import Timer
+from helpers.multicall.transport import get_default_transport
+from helpers.multicall.tuning import classify_error, is_execution_error
 from rich.console import Console
 
 console = Console()
 
+AGGREGATE = "aggregate((address,bytes)[])(uint256,bytes[])"
+TRY_AGGREGATE = "tryAggregate(bool,(address,bytes)[])((bool,bytes)[])"
+AGGREGATE3 = "aggregate3((address,bool,bytes)[])((bool,bytes)[])"
+
+## Conservative limits so a single aggregate() stays under common provider caps
+MAX_CALLDATA_BYTES = 64_000
+MAX_CHUNK_GAS = 25_000_000
+## Rough cost of one view call inside aggregate (cold account + storage reads)
+GAS_PER_CALL = 50_000
+MAX_WORKERS = 8
+
+
+class Failure:
+    """
+    Sentinel returned in place of a value when a call reverts or can't be decoded
+    """
+
+    __slots__ = ("target", "function", "args", "reason")
+
+    def __init__(self, call, reason):
+        self.target = call.target
+        self.function = call.function
+        self.args = call.args
+        self.reason = reason
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "Failure({} {}{}: {})".format(
+            self.target, self.function, self.args or "", self.reason
+        )
+
+
+def calldata_size(call):
+    """
+    ABI-encoded size of a (address,bytes) tuple inside aggregate's calldata
+    """
+    data_length = len(call.data)
+    # tuple offset + address + bytes offset + bytes length + padded bytes
+    return 32 * 4 + (data_length + 31) // 32 * 32
+
+
+def chunk_calls(calls, max_calldata_bytes, max_gas, gas_per_call=GAS_PER_CALL):
+    """
+    Split calls into consecutive chunks bounded by calldata bytes and estimated gas
+    """
+    chunks = []
+    current = []
+    size = gas = 0
+    for call in calls:
+        call_size = calldata_size(call)
+        if current and (
+            size + call_size > max_calldata_bytes or gas + gas_per_call > max_gas
+        ):
+            chunks.append(current)
+            current = []
+            size = gas = 0
+        current.append(call)
+        size += call_size
+        gas += gas_per_call
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def halves(calls):
+    middle = len(calls) // 2
+    return [calls[:middle], calls[middle:]]
+
+
+def dedupe_calls(calls):
+    """
+    Unique calls by (target, calldata), plus each call's index into them
+    """
+    unique = []
+    fanout = []
+    seen = {}
+    for call in calls:
+        key = (call.target, call.data, call.allow_failure)
+        if key not in seen:
+            seen[key] = len(unique)
+            unique.append(call)
+        fanout.append(seen[key])
+    return unique, fanout
+
 
 class Multicall:
-    def __init__(self, calls: List[Call]):
+    def __init__(
+        self,
+        calls: List[Call],
+        max_calldata_bytes=MAX_CALLDATA_BYTES,
+        max_gas=MAX_CHUNK_GAS,
+        max_workers=MAX_WORKERS,
+        require_success=True,
+        block_identifier=None,
+        cache=None,
+        transport=None,
+        sink=None,
+        estimate_gas=False,
+        state_override=None,
+        tuner=None,
+    ):
+        """
+        With require_success=False a reverting call yields a Failure for its keys
+        instead of reverting the whole aggregate. Calls can override this
+        individually through Call.allow_failure.
+        When block_identifier is a block number, results are read from and stored
+        in the optional ResponseCache.
+        Without an aggregator contract on the chain, calls go out as a JSON-RPC
+        batch through the transport instead.
+        After each run, self.metrics holds call counts, payload sizes, the
+        encode/rpc/decode time split and cache hits, and is emitted to sink.
+        estimate_gas=True adds an eth_estimateGas per aggregate request.
+        state_override is sent as eth_call's override set, {address: {"balance",
+        "nonce", "code", "state", "stateDiff"}}, to read the plan against a
+        hypothetical state. Results under an override are never cached.
+        With a ChunkTuner (helpers.multicall.tuning), chunks are sized from the
+        limit learned for the transport's endpoint, starting at
+        max_calldata_bytes, and oversized or throttled chunks are split and
+        retried with backoff.
+        """
+        self.timer = Timer()
         self.calls = calls
+        self.unique_calls, self.fanout = dedupe_calls(calls)
+        # Number of calls folded into an identical (target, calldata) request
+        self.removed = len(calls) - len(self.unique_calls)
+        self.max_calldata_bytes = max_calldata_bytes
+        self.max_gas = max_gas
+        self.max_workers = max_workers
+        self.require_success = require_success
+        self.block_identifier = block_identifier
+        self.cache = cache
+        self.transport = transport or get_default_transport()
+        self.sink = sink
+        self.estimate_gas = estimate_gas
+        self.state_override = state_override
+        self.tuner = tuner
+        self.metrics = None
+        # Block number reported by aggregate(), when the aggregator returns one
+        self.block = None
 
     def printCalls(self):
         for call in self.calls:
@@ -20,14 +170,443 @@ class Multicall:
                 {"target": call.target, "function": call.function, "args": call.args}
             )
 
-    def __call__(self):
-        aggregate = Call(
-            MULTICALL_ADDRESSES[web3.eth.chainId],
-            "aggregate((address,bytes)[])(uint256,bytes[])",
+    @property
+    def endpoint(self):
+        return getattr(self.transport, "endpoint_uri", None)
+
+    def chunk_bytes(self):
+        if self.tuner is None:
+            return self.max_calldata_bytes
+        return self.tuner.limit(self.endpoint, self.max_calldata_bytes)
+
+    def chunks(self, calls=None):
+        return chunk_calls(
+            self.unique_calls if calls is None else calls,
+            self.chunk_bytes(),
+            self.max_gas,
+        )
+
+    def pin_block(self, chunks):
+        """
+        Block number every chunk of a run reads at, so chunks sent against
+        "latest" don't mix state from blocks mined in between
+        """
+        if self.block_identifier is None and len(chunks) > 1:
+            return self.transport.block_number()
+        return self.block_identifier
+
+    def cacheable(self):
+        return (
+            self.cache is not None
+            and isinstance(self.block_identifier, int)
+            and not self.state_override
+        )
+
+    def cache_key(self, chain_id, call):
+        return (chain_id, self.block_identifier, call.target, call.data)
+
+    def lookup(self, chain_id, calls=None):
+        """
+        Cached (success, returnData) per call, None for the ones to fetch,
+        and the indexes of those
+        """
+        calls = self.unique_calls if calls is None else calls
+        if not self.cacheable():
+            return [None] * len(calls), list(range(len(calls)))
+        pairs = [self.cache.get(self.cache_key(chain_id, call)) for call in calls]
+        return pairs, [index for index, pair in enumerate(pairs) if pair is None]
+
+    def store(self, chain_id, pairs, pending, outputs, calls=None):
+        calls = self.unique_calls if calls is None else calls
+        fetched = iter([pair for chunk_outputs in outputs for pair in chunk_outputs])
+        for index in pending:
+            pairs[index] = next(fetched)
+            success, output = pairs[index]
+            # Bisection failures carry an error message, not return data
+            if self.cacheable() and not isinstance(output, str):
+                self.cache.set(self.cache_key(chain_id, calls[index]), *pairs[index])
+        if self.cacheable():
+            self.cache.flush()
+        return pairs
+
+    def allows_failure(self, call):
+        if call.allow_failure is None:
+            return not self.require_success
+        return call.allow_failure
+
+    def fault_tolerant(self):
+        return not self.require_success or any(
+            call.allow_failure for call in self.calls
         )
-        args = [[[call.target, call.data] for call in self.calls]]
-        block, outputs = aggregate(args)
+
+    def aggregator_candidates(self, chain_id):
+        if self.fault_tolerant():
+            candidates = [
+                (MULTICALL3_ADDRESSES, AGGREGATE3),
+                (MULTICALL2_ADDRESSES, TRY_AGGREGATE),
+            ]
+        else:
+            candidates = [
+                (MULTICALL_ADDRESSES, AGGREGATE),
+                (MULTICALL3_ADDRESSES, AGGREGATE3),
+            ]
+        return [
+            Call(addresses[chain_id], function)
+            for addresses, function in candidates
+            if chain_id in addresses
+        ]
+
+    def aggregator(self, chain_id):
+        """
+        Deployed aggregator contract for the chain, None to fall back to a
+        JSON-RPC batch of plain eth_calls
+        """
+        for aggregator in self.aggregator_candidates(chain_id):
+            if self.transport.has_code(aggregator.target):
+                return aggregator
+        return None
+
+    def aggregate_args(self, aggregator, calls):
+        if aggregator.function == AGGREGATE:
+            return [[[call.target, call.data] for call in calls]]
+        if aggregator.function == AGGREGATE3:
+            return [
+                [[call.target, self.allows_failure(call), call.data] for call in calls]
+            ]
+        return [False, [[call.target, call.data] for call in calls]]
+
+    def aggregate_results(self, aggregator, output, calls):
+        """
+        Returns one (success, returnData) pair per call
+        """
+        decode = (
+            decode_aggregate if aggregator.function == AGGREGATE else decode_results
+        )
+        try:
+            decoded = decode(output)
+        except (ValueError, IndexError):
+            # Malformed response, let eth_abi produce the proper error
+            decoded = aggregator.decode_output(output)
+        if aggregator.function == AGGREGATE:
+            self.block, outputs = decoded
+            pairs = [(True, output) for output in outputs]
+        else:
+            pairs = list(decoded)
+        if len(pairs) != len(calls):
+            # e.g. an empty response from a node that didn't run the aggregate
+            raise ValueError(
+                "{} returned {} results for {} calls".format(
+                    aggregator.target, len(pairs), len(calls)
+                )
+            )
+        return pairs
+
+    def aggregate_tx(self, aggregator, calls):
+        calldata = aggregator.signature.encode_data(
+            self.aggregate_args(aggregator, calls)
+        )
+        return {"to": aggregator.target, "data": calldata}
+
+    def batch_txs(self, calls):
+        return [{"to": call.target, "data": call.data} for call in calls]
+
+    def prepare(self, aggregator, calls):
+        with self.timer.time("encode_time"):
+            if aggregator is None:
+                txs = self.batch_txs(calls)
+            else:
+                txs = [self.aggregate_tx(aggregator, calls)]
+        self.timer.add("requests", 1)
+        self.timer.add("calldata_bytes", sum(len(tx["data"]) for tx in txs))
+        return txs
+
+    def finish(self, aggregator, response, calls):
+        if aggregator is None:
+            self.timer.add(
+                "response_bytes",
+                sum(len(output) for success, output in response if success),
+            )
+            return response
+        self.timer.add("response_bytes", len(response))
+        with self.timer.time("decode_time"):
+            return self.aggregate_results(aggregator, response, calls)
+
+    def fetch(self, aggregator, calls):
+        txs = self.prepare(aggregator, calls)
+        with self.timer.time("rpc_time"):
+            if aggregator is None:
+                response = self.transport.batch_call(
+                    txs, self.block_identifier, self.state_override
+                )
+            else:
+                response = self.transport.eth_call(
+                    txs[0], self.block_identifier, self.state_override
+                )
+        if aggregator is not None and self.estimate_gas:
+            self.timer.add(
+                "gas_used", self.transport.estimate_gas(txs[0], self.block_identifier)
+            )
+        return self.finish(aggregator, response, calls)
+
+    def fetch_adaptive(self, aggregator, calls, attempt=0):
+        """
+        fetch() that feeds the tuner, splitting and retrying chunks the
+        endpoint rejected as too big and pausing on throttling
+        """
+        if self.tuner is None:
+            return self.fetch(aggregator, calls)
+        start = time.perf_counter()
+        try:
+            pairs = self.fetch(aggregator, calls)
+        except Exception as e:
+            retry = self.retry(calls, e, attempt)
+            if retry is None:
+                raise
+            delay, parts = retry
+            time.sleep(delay)
+            return [
+                pair
+                for part in parts
+                for pair in self.fetch_adaptive(aggregator, part, attempt + 1)
+            ]
+        self.record_latency(calls, start)
+        return pairs
+
+    def retry(self, calls, error, attempt):
+        """
+        Pause before retrying a chunk the tuner can recover from, and the
+        parts to retry it as, None to give up and raise error
+        """
+        kind = classify_error(error, len(calls))
+        if kind is None or attempt >= self.tuner.max_retries:
+            return None
+        size = sum(calldata_size(call) for call in calls)
+        self.tuner.record_error(self.endpoint, kind, size, self.max_calldata_bytes)
+        self.timer.add("retries", 1)
+        parts = halves(calls) if kind != "transient" and len(calls) > 1 else [calls]
+        return self.tuner.delay(attempt), parts
+
+    def record_latency(self, calls, start):
+        self.tuner.record_success(
+            self.endpoint,
+            sum(calldata_size(call) for call in calls),
+            time.perf_counter() - start,
+            self.max_calldata_bytes,
+        )
+
+    def fetch_chunk(self, aggregator, calls):
+        try:
+            return self.fetch_adaptive(aggregator, calls)
+        except Exception as e:
+            if not self.bisects(calls, e):
+                raise
+            if len(calls) == 1:
+                return [(False, str(e))]
+            return [
+                pair
+                for part in halves(calls)
+                for pair in self.fetch_chunk(aggregator, part)
+            ]
+
+    def bisects(self, calls, error):
+        """
+        Whether a failed chunk is split until the offending call is isolated,
+        which then becomes a Failure
+        """
+        if not self.fault_tolerant() or not is_execution_error(error):
+            # A dead node or a timeout isn't a failing call, don't hide it
+            return False
+        return len(calls) > 1 or self.allows_failure(calls[0])
+
+    def decode(self, call, success, output):
+        if isinstance(output, memoryview):
+            output = bytes(output)
+        if not self.allows_failure(call):
+            if not success:
+                # Revert data, or the node's error message from bisection
+                reason = output
+                if isinstance(output, bytes):
+                    reason = "0x" + bytes(output).hex()
+                raise Exception(
+                    "Call {} {} failed: {}".format(call.target, call.function, reason)
+                )
+            return call.decode_output(output)
+
+        if success:
+            try:
+                return call.decode_output(output)
+            except Exception as e:
+                # e.g. an EOA or a contract without the function returns empty data
+                output = e
+        failure = Failure(call, output)
+        if not call.returns:
+            return {call.function: failure}
+        return {name: failure for name, handler in call.returns}
+
+    def __call__(self):
+        start = time.perf_counter()
+        # Metrics are per run, not per instance
+        self.timer = Timer()
+        chain_id = self.transport.chain_id()
+        aggregator = self.aggregator(chain_id)
+        pairs, pending = self.lookup(chain_id)
+        chunks = self.chunks([self.unique_calls[index] for index in pending])
+        block_identifier = self.block_identifier
+        self.block_identifier = self.pin_block(chunks)
+        try:
+            if len(chunks) <= 1 or self.max_workers <= 1:
+                outputs = [self.fetch_chunk(aggregator, calls) for calls in chunks]
+            else:
+                workers = min(self.max_workers, len(chunks))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    # map() yields in submission order, so results merge in call order
+                    outputs = list(
+                        executor.map(
+                            lambda calls: self.fetch_chunk(aggregator, calls), chunks
+                        )
+                    )
+            return self.complete(chain_id, aggregator, pairs, pending, outputs, start)
+        finally:
+            # Pinned for this run only, the next one reads the then latest block
+            self.block_identifier = block_identifier
+
+    def complete(self, chain_id, aggregator, pairs, pending, outputs, start):
+        """
+        Merged result of a run, from the cached pairs and the fetched chunks
+        """
+        pairs = self.store(chain_id, pairs, pending, outputs)
+        with self.timer.time("decode_time"):
+            result = self.merge(pairs)
+        self.report(aggregator, len(outputs), len(pairs) - len(pending), start)
+        return result
+
+    def indexed_chunks(self):
+        """
+        Chunks of unique_calls with the index of their first call
+        """
+        offset = 0
+        for calls in self.chunks():
+            yield offset, calls
+            offset += len(calls)
+
+    def callers(self):
+        """
+        Calls reading each unique call's response, duplicates included
+        """
+        callers = [[] for call in self.unique_calls]
+        for call, index in zip(self.calls, self.fanout):
+            callers[index].append(call)
+        return callers
+
+    def resolve(self, chain_id, aggregator, calls):
+        """
+        (success, returnData) for one chunk, from the cache where possible
+        """
+        pairs, pending = self.lookup(chain_id, calls)
+        if not pending:
+            return pairs, 0
+        outputs = [self.fetch_chunk(aggregator, [calls[index] for index in pending])]
+        pairs = self.store(chain_id, pairs, pending, outputs, calls)
+        return pairs, len(calls) - len(pending)
+
+    def in_flight(self):
+        """
+        Chunks stream() keeps requested ahead of the one being consumed
+        """
+        return 2 * max(1, self.max_workers)
+
+    def items(self, callers, offset, pairs):
+        with self.timer.time("decode_time"):
+            items = []
+            for index, (success, output) in enumerate(pairs, offset):
+                for call in callers[index]:
+                    items.extend(self.decode_call(call, success, output).items())
+        return items
+
+    def stream(self):
+        """
+        Yields decoded (key, value) pairs chunk by chunk as responses arrive
+        Chunks come out in plan order with at most 2 * max_workers in flight,
+        and no merged dict is built, so memory stays flat on huge plans.
+        A duplicated call's keys come out with its first occurrence.
+        """
+        start = time.perf_counter()
+        self.timer = Timer()
+        chain_id = self.transport.chain_id()
+        aggregator = self.aggregator(chain_id)
+        callers = self.callers()
+        chunks = cache_hits = 0
+        block_identifier = self.block_identifier
+        self.block_identifier = self.pin_block(self.chunks())
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+                pending = deque()
+                try:
+                    for offset, calls in self.indexed_chunks():
+                        chunks += 1
+                        pending.append(
+                            (
+                                offset,
+                                executor.submit(
+                                    self.resolve, chain_id, aggregator, calls
+                                ),
+                            )
+                        )
+                        if len(pending) < self.in_flight():
+                            continue
+                        offset, future = pending.popleft()
+                        pairs, hits = future.result()
+                        cache_hits += hits
+                        yield from self.items(callers, offset, pairs)
+                    while pending:
+                        offset, future = pending.popleft()
+                        pairs, hits = future.result()
+                        cache_hits += hits
+                        yield from self.items(callers, offset, pairs)
+                finally:
+                    # Consumer stopped early, don't fetch chunks nobody will read
+                    for offset, future in pending:
+                        future.cancel()
+            self.report(aggregator, chunks, cache_hits, start)
+        finally:
+            # Pinned for this run only, the next one reads the then latest block
+            self.block_identifier = block_identifier
+
+    def report(self, aggregator, chunks, cache_hits, start):
+        if self.tuner is not None:
+            self.tuner.save()
+        self.metrics = {
+            "event": "multicall",
+            "calls": len(self.calls),
+            "unique_calls": len(self.unique_calls),
+            "removed": self.removed,
+            "block": (
+                "latest" if self.block_identifier is None else self.block_identifier
+            ),
+            **self.timer.values,
+            "aggregator": aggregator.signature.parts[0] if aggregator else "batch",
+            "chunks": chunks,
+            "cache_hits": cache_hits,
+            "wall_time": time.perf_counter() - start,
+        }
+        if self.sink is not None:
+            self.sink.emit(self.metrics)
+        return self.metrics
+
+    def merge(self, pairs):
+        """
+        Decode per-call results, pairs are aligned with unique_calls
+        Duplicated calls all read their keys from the one shared response
+        """
         result = {}
-        for call, output in zip(self.calls, outputs):
-            result.update(call.decode_output(output))
+        for call, index in zip(self.calls, self.fanout):
+            result.update(self.decode_call(call, *pairs[index]))
         return result
+
+    def decode_call(self, call, success, output):
+        # Fast path for single uint256 getters, the bulk of a snapshot
+        if success and call.uint256_key and len(output) == 32:
+            name, handler = call.uint256_key
+            value = from_bytes(output, "big")
+            return {name: handler(value) if handler else value}
+        return self.decode(call, success, output)
@@ -0,0 +1,43 @@
+from eth_utils import keccak, to_checksum_address
+from hexbytes import HexBytes
+
+
+def to_word(value):
+    if isinstance(value, int):
+        return "0x" + value.to_bytes(32, "big").hex()
+    return "0x" + HexBytes(value).rjust(32, b"\x00").hex()
+
+
+def mapping_slot(key, slot):
+    """
+    Storage slot of mapping[key] for a mapping declared at slot
+    e.g. the ERC20 balance of holder: mapping_slot(holder, balances_slot)
+    """
+    if isinstance(key, str):
+        key = HexBytes(key)
+    if isinstance(key, int):
+        key = key.to_bytes(32, "big")
+    return "0x" + keccak(bytes(key).rjust(32, b"\x00") + slot.to_bytes(32, "big")).hex()
+
+
+def format_state_override(overrides):
+    """
+    Normalize {address: {"balance", "nonce", "code", "state", "stateDiff"}}
+    to the hex encoding eth_call expects as its third parameter
+    """
+    formatted = {}
+    for address, account in overrides.items():
+        entry = {}
+        for field, value in account.items():
+            if field in ("balance", "nonce"):
+                entry[field] = hex(value) if isinstance(value, int) else value
+            elif field == "code":
+                entry[field] = HexBytes(value).hex()
+            elif field in ("state", "stateDiff"):
+                entry[field] = {
+                    to_word(slot): to_word(word) for slot, word in value.items()
+                }
+            else:
+                entry[field] = value
+        formatted[to_checksum_address(address)] = entry
+    return formatted
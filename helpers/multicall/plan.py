@@ -0,0 +1,77 @@
+import copy
+
+from eth_utils import keccak, to_checksum_address
+
+
+def slot_address(key):
+    """
+    Deterministic placeholder address standing in for an entity slot
+    """
+    return to_checksum_address(keccak(text="CallPlan slot " + key)[-20:])
+
+
+def address_word(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+def patch_call(call, replacements):
+    """
+    Copy of call with placeholder addresses swapped in target, args and calldata
+    The calldata is patched in place of the padded address word, no re-encoding
+    """
+    patched = copy.copy(call)
+    patched.target = replacements.get(call.target, call.target)
+    if call.args:
+        patched.args = [replacements.get(arg, arg) for arg in call.args]
+    data = call.data
+    for placeholder, address in replacements.items():
+        data = data.replace(address_word(placeholder), address_word(address))
+    patched._data = data
+    return patched
+
+
+class CallPlan:
+    """
+    Call list compiled once, with named slots for per-operation entities
+    build(slots) must return the calls for the given {key: address} slots,
+    plan.bind({key: address}) then returns ready-to-send calls for that binding
+    """
+
+    def __init__(self, build, slots=()):
+        self.slots = {key: slot_address(key) for key in slots}
+        self.calls = build(dict(self.slots))
+        # Encode everything up front, bind() only patches bytes
+        for call in self.calls:
+            call.data
+        self.slot_calls = {}
+        words = {key: address_word(address) for key, address in self.slots.items()}
+        for index, call in enumerate(self.calls):
+            keys = [
+                key
+                for key, address in self.slots.items()
+                if call.target == address or words[key] in call.data
+            ]
+            if keys:
+                self.slot_calls[index] = keys
+
+    def __len__(self):
+        return len(self.calls)
+
+    def bind(self, values=None):
+        """
+        Calls with slots bound to addresses, calls for unbound slots are left out
+        """
+        values = values or {}
+        replacements = {
+            self.slots[key]: to_checksum_address(address)
+            for key, address in values.items()
+            if key in self.slots
+        }
+        calls = []
+        for index, call in enumerate(self.calls):
+            keys = self.slot_calls.get(index)
+            if keys is None:
+                calls.append(call)
+            elif all(self.slots[key] in replacements for key in keys):
+                calls.append(patch_call(call, replacements))
+        return calls
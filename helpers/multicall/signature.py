@@ -1,9 +1,84 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/signature.py
 
-from eth_abi import encode_single, decode_single
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.registry import registry
 from eth_utils import function_signature_to_4byte_selector
 
 
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "CacheStats(hits={}, misses={}, hit_rate={:.2%})".format(
+            self.hits, self.misses, self.hit_rate
+        )
+
+
+## Process-wide caches, keyed by signature / ABI type string
+_signatures = {}
+_encoders = {}
+_decoders = {}
+
+signature_cache_stats = CacheStats()
+codec_cache_stats = CacheStats()
+
+
+def get_encoder(type_str):
+    encoder = _encoders.get(type_str)
+    if encoder is None:
+        codec_cache_stats.misses += 1
+        encoder = _encoders[type_str] = registry.get_encoder(type_str)
+    else:
+        codec_cache_stats.hits += 1
+    return encoder
+
+
+def get_decoder(type_str):
+    decoder = _decoders.get(type_str)
+    if decoder is None:
+        codec_cache_stats.misses += 1
+        decoder = _decoders[type_str] = registry.get_decoder(type_str)
+    else:
+        codec_cache_stats.hits += 1
+    return decoder
+
+
+def get_signature(signature):
+    """
+    Interned Signature, parsed and hashed only the first time it's seen
+    """
+    cached = _signatures.get(signature)
+    if cached is None:
+        signature_cache_stats.misses += 1
+        cached = _signatures[signature] = Signature(signature)
+    else:
+        signature_cache_stats.hits += 1
+    return cached
+
+
+def signature_cache_info():
+    return {
+        "signatures": len(_signatures),
+        "signature_hits": signature_cache_stats.hits,
+        "signature_misses": signature_cache_stats.misses,
+        "signature_hit_rate": signature_cache_stats.hit_rate,
+        "codec_hits": codec_cache_stats.hits,
+        "codec_misses": codec_cache_stats.misses,
+        "codec_hit_rate": codec_cache_stats.hit_rate,
+    }
+
+
 def parse_signature(signature):
     """
     Breaks 'func(address)(uint256)' into ['func', '(address)', '(uint256)']
@@ -33,13 +108,13 @@ class Signature:
         self.output_types = self.parts[2]
         self.function = "".join(self.parts[:2])
         self.fourbyte = function_signature_to_4byte_selector(self.function)
+        self.encoder = get_encoder(self.input_types)
+        self.decoder = get_decoder(self.output_types)
+        # Lets Multicall skip eth_abi for the most common return type
+        self.single_uint256 = self.output_types == "(uint256)"
 
     def encode_data(self, args=None):
-        return (
-            self.fourbyte + encode_single(self.input_types, args)
-            if args
-            else self.fourbyte
-        )
+        return self.fourbyte + self.encoder(args) if args else self.fourbyte
 
     def decode_data(self, output):
-        return decode_single(self.output_types, output)
+        return self.decoder(ContextFramesBytesIO(output))
@@ -0,0 +1,349 @@
+import itertools
+
+import requests
+from brownie import web3
+from hexbytes import HexBytes
+from web3 import HTTPProvider
+
+from helpers.multicall.overrides import format_state_override
+
+POOL_SIZE = 16
+TIMEOUT = 30
+
+try:
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+def to_block_param(block_identifier):
+    if block_identifier is None:
+        return "latest"
+    if isinstance(block_identifier, int):
+        return hex(block_identifier)
+    return block_identifier
+
+
+def to_rpc_tx(tx):
+    return {"to": tx["to"], "data": HexBytes(tx["data"]).hex()}
+
+
+def call_params(tx, block_identifier, state_override=None):
+    params = [to_rpc_tx(tx), to_block_param(block_identifier)]
+    if state_override:
+        params.append(format_state_override(state_override))
+    return params
+
+
+def estimate_gas_params(tx, block_identifier):
+    return [to_rpc_tx(tx), to_block_param(block_identifier)]
+
+
+def parse_response(response):
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response["result"]
+
+
+def parse_batch(payload, responses):
+    """
+    One (success, returnData or error) pair per request of a batch payload
+    """
+    if isinstance(responses, dict):
+        # Node rejected the batch as a whole
+        raise ValueError(responses.get("error", responses))
+    by_id = {response["id"]: response for response in responses}
+    pairs = []
+    for request in payload:
+        response = by_id.get(request["id"], {"error": "missing response"})
+        if "result" in response:
+            pairs.append((True, HexBytes(response["result"])))
+        else:
+            pairs.append((False, str(response["error"])))
+    return pairs
+
+
+class JSONRPCClient:
+    """
+    Request ids and payloads shared by the blocking transports below and
+    helpers.multicall.async_multicall.AsyncRPC, which only differ in how a
+    payload is sent
+    """
+
+    def __init__(self):
+        self._ids = itertools.count()
+        self._code = {}
+        self._chain_id = None
+
+    def payload(self, method, params):
+        return {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params,
+        }
+
+    def batch_payload(self, txs, block_identifier=None, state_override=None):
+        return [
+            self.payload("eth_call", call_params(tx, block_identifier, state_override))
+            for tx in txs
+        ]
+
+
+class JSONRPCTransport(JSONRPCClient):
+    """
+    Base transport speaking raw JSON-RPC through post(payload)
+    batch_call packs many eth_calls into one JSON-RPC batch, for chains where no
+    aggregator contract is deployed
+    """
+
+    @property
+    def endpoint_uri(self):
+        return None
+
+    def post(self, payload):
+        raise NotImplementedError
+
+    def request(self, method, params):
+        return parse_response(self.post(self.payload(method, params)))
+
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = int(self.request("eth_chainId", []), 16)
+        return self._chain_id
+
+    def block_number(self):
+        return int(self.request("eth_blockNumber", []), 16)
+
+    def get_code(self, address):
+        return HexBytes(self.request("eth_getCode", [address, "latest"]))
+
+    def has_code(self, address):
+        # Deployed aggregators don't go away, so one lookup per address is enough,
+        # as long as the endpoint still serves the same chain (brownie networks)
+        key = (self.endpoint_uri, self.chain_id(), address)
+        if key not in self._code:
+            self._code[key] = len(self.get_code(address)) > 0
+        return self._code[key]
+
+    def eth_call(self, tx, block_identifier=None, state_override=None):
+        return HexBytes(
+            self.request("eth_call", call_params(tx, block_identifier, state_override))
+        )
+
+    def estimate_gas(self, tx, block_identifier=None):
+        return int(
+            self.request("eth_estimateGas", estimate_gas_params(tx, block_identifier)),
+            16,
+        )
+
+    def supports_batch(self):
+        return True
+
+    def batch_call(self, txs, block_identifier=None, state_override=None):
+        """
+        Returns one (success, returnData or error) pair per tx
+        """
+        if not self.supports_batch():
+            return [self.try_call(tx, block_identifier, state_override) for tx in txs]
+
+        payload = self.batch_payload(txs, block_identifier, state_override)
+        return parse_batch(payload, self.post(payload))
+
+    def try_call(self, tx, block_identifier=None, state_override=None):
+        try:
+            return True, self.eth_call(tx, block_identifier, state_override)
+        except Exception as e:
+            return False, str(e)
+
+
+class HTTPTransport(JSONRPCTransport):
+    """
+    JSON-RPC over a pooled keep-alive HTTP session
+    Use HTTPTransport.shared(uri) so every Multicall, script and test in the
+    process reuses the same connections to a node.
+    http2=True needs httpx with h2 (pip install "httpx[http2]")
+    """
+
+    def __init__(
+        self, endpoint_uri=None, pool_size=POOL_SIZE, timeout=TIMEOUT, http2=False
+    ):
+        super().__init__()
+        self._endpoint_uri = endpoint_uri
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.http2 = http2
+        self._session = None
+
+    @classmethod
+    def shared(
+        cls, endpoint_uri=None, pool_size=POOL_SIZE, timeout=TIMEOUT, http2=False
+    ):
+        """
+        One transport per endpoint and settings, callers asking for another
+        pool_size or timeout get their own pool
+        """
+        endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+        key = (endpoint_uri, pool_size, timeout, http2)
+        if key not in _shared_transports:
+            _shared_transports[key] = cls(endpoint_uri, pool_size, timeout, http2)
+        return _shared_transports[key]
+
+    @property
+    def endpoint_uri(self):
+        return self._endpoint_uri or web3.provider.endpoint_uri
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = (
+                self._httpx_client() if self.http2 else self._requests_session()
+            )
+        return self._session
+
+    def _requests_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(
+            {"Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"}
+        )
+        return session
+
+    def _httpx_client(self):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError('http2=True requires: pip install "httpx[http2]"')
+        limits = httpx.Limits(
+            max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+        )
+        return httpx.Client(
+            http2=True,
+            limits=limits,
+            timeout=self.timeout,
+            headers={"Accept-Encoding": ACCEPT_ENCODING},
+        )
+
+    def post(self, payload):
+        if self.http2:
+            response = self.session.post(self.endpoint_uri, json=payload)
+        else:
+            response = self.session.post(
+                self.endpoint_uri, json=payload, timeout=self.timeout
+            )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class Web3Transport(JSONRPCTransport):
+    """
+    Sends a Multicall's eth_calls through a web3 instance (brownie's by default)
+    JSON-RPC batches go through a pooled session to the provider's endpoint
+    """
+
+    def __init__(self, w3=None):
+        super().__init__()
+        self._w3 = w3
+
+    @property
+    def w3(self):
+        return self._w3 or web3
+
+    @property
+    def endpoint_uri(self):
+        return getattr(self.w3.provider, "endpoint_uri", None)
+
+    def chain_id(self):
+        return self.w3.eth.chainId
+
+    def block_number(self):
+        return self.w3.eth.block_number
+
+    def get_code(self, address):
+        return self.w3.eth.get_code(address)
+
+    def eth_call(self, tx, block_identifier=None, state_override=None):
+        if not state_override:
+            return self.w3.eth.call(tx, block_identifier)
+        # Sent raw, as not every web3 version forwards the override set
+        return HexBytes(
+            parse_response(
+                self.w3.provider.make_request(
+                    "eth_call", call_params(tx, block_identifier, state_override)
+                )
+            )
+        )
+
+    def estimate_gas(self, tx, block_identifier=None):
+        return self.w3.eth.estimate_gas(tx, block_identifier)
+
+    def supports_batch(self):
+        return isinstance(self.w3.provider, HTTPProvider)
+
+    def post(self, payload):
+        return HTTPTransport.shared(self.endpoint_uri).post(payload)
+
+
+class InProcessTransport(Web3Transport):
+    """
+    Runs calls against an in-process EVM (eth-tester + py-evm), no node needed
+    Contracts are deployed locally with deploy(); as no aggregator is deployed
+    on the tester chain, plans are sent as direct in-process eth_calls.
+    Requires: pip install "eth-tester[py-evm]"
+    """
+
+    def __init__(self, w3=None):
+        if w3 is None:
+            from web3 import EthereumTesterProvider, Web3
+
+            w3 = Web3(EthereumTesterProvider())
+        super().__init__(w3)
+
+    @property
+    def accounts(self):
+        return self.w3.eth.accounts
+
+    def deploy(self, abi, bytecode, *args, sender=None):
+        """
+        Deploy a contract from its ABI and bytecode, returns its address
+        """
+        contract = self.w3.eth.contract(abi=abi, bytecode=bytecode)
+        tx_hash = contract.constructor(*args).transact(
+            {"from": sender or self.accounts[0]}
+        )
+        return self.w3.eth.wait_for_transaction_receipt(tx_hash).contractAddress
+
+    def deploy_container(self, container, *args, sender=None):
+        """
+        Deploy a compiled brownie ContractContainer (e.g. TheVault)
+        """
+        return self.deploy(container.abi, container.bytecode, *args, sender=sender)
+
+
+_shared_transports = {}
+_default_transport = Web3Transport()
+
+
+def get_default_transport():
+    return _default_transport
+
+
+def set_default_transport(transport):
+    """
+    Transport used by Call and Multicall when none is passed
+    e.g. set_default_transport(HTTPTransport.shared()) to pool connections to
+    brownie's node for every snapshot in the process
+    """
+    global _default_transport
+    _default_transport = transport
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import threading
+
+MIN_BYTES = 2_000
+MAX_BYTES = 512_000
+## Additive step after a fast, well-filled chunk
+INCREASE_BYTES = 2_000
+## Growth stops short of the smallest payload the endpoint rejected
+CEILING_MARGIN = 0.9
+## Successes after which the smallest rejected payload no longer caps growth
+CEILING_SUCCESSES = 50
+## Multiplicative cut after a rejected / timed out chunk, and after a slow one
+ERROR_DECREASE = 0.5
+LATENCY_DECREASE = 0.8
+TARGET_LATENCY = 2.0
+MAX_RETRIES = 4
+BACKOFF = 0.25
+
+## Lower-cased error fragments meaning the chunk was too big for the endpoint
+SIZE_ERRORS = (
+    "payload too large",
+    "request entity too large",
+    "response size",
+    "too large",
+)
+## ... or, for a chunk of several calls, too big for the gas cap
+GAS_ERRORS = (
+    "out of gas",
+    "gas required exceeds",
+    "exceeds block gas limit",
+)
+## ... and ones that may only mean the endpoint was busy
+TIMEOUT_ERRORS = (
+    "timed out",
+    "timeout",
+)
+## ... and ones worth retrying as is after a pause
+TRANSIENT_ERRORS = (
+    "429",
+    "too many requests",
+    "rate limit",
+    "connection reset",
+    "connection aborted",
+    "bad gateway",
+    "service unavailable",
+)
+
+## ... and ones raised by the EVM running the calls, the only errors a
+## fault-tolerant Multicall bisects to isolate the failing call
+EXECUTION_ERRORS = (
+    "revert",
+    "out of gas",
+    "gas required exceeds",
+    "invalid opcode",
+    "invalid jump",
+    "stack underflow",
+    "stack overflow",
+    "vm exception",
+)
+
+
+def classify_error(error, calls=2):
+    """
+    "size", "timeout", "transient" or None for errors that retrying won't fix
+    (e.g. a revert), for a chunk of that many calls
+    A single call running out of gas is failing, not too big, and a single
+    call can't be split any further, so neither is retried.
+    """
+    message = str(error).lower()
+    if isinstance(error, asyncio.TimeoutError) or any(
+        fragment in message for fragment in TIMEOUT_ERRORS
+    ):
+        return "timeout"
+    if any(fragment in message for fragment in SIZE_ERRORS + GAS_ERRORS):
+        return "size" if calls > 1 else None
+    if any(fragment in message for fragment in TRANSIENT_ERRORS):
+        return "transient"
+    return None
+
+
+def is_execution_error(error):
+    """
+    True when the node ran the calls and one of them failed (revert, out of
+    gas), False for connection, HTTP, timeout and rate limit errors, which say
+    nothing about the calls
+    """
+    # requests' ConnectionError, HTTPError and Timeout are OSErrors too
+    if isinstance(error, (OSError, asyncio.TimeoutError)):
+        return False
+    message = str(error).lower()
+    if "timeout" in message or "timed out" in message:
+        return False
+    return any(fragment in message for fragment in EXECUTION_ERRORS)
+
+
+class ChunkTuner:
+    """
+    Learns the chunk calldata limit per endpoint with AIMD control
+    A fast chunk that used at least half the limit raises it by INCREASE_BYTES,
+    up to just below the smallest payload the endpoint rejected, a slow one
+    (above target_latency) cuts it by LATENCY_DECREASE, and a size error or
+    timeout halves it. Only size errors set that ceiling, and it's dropped
+    again after ceiling_successes successful chunks. Pass a path to keep the
+    learned limits between runs, Multicall(tuner=tuner) saves them after
+    each run.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        min_bytes=MIN_BYTES,
+        max_bytes=MAX_BYTES,
+        target_latency=TARGET_LATENCY,
+        max_retries=MAX_RETRIES,
+        backoff=BACKOFF,
+        ceiling_successes=CEILING_SUCCESSES,
+    ):
+        self.path = path
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.ceiling_successes = ceiling_successes
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.endpoints = json.load(f)
+
+    def state(self, endpoint):
+        return self.endpoints.setdefault(
+            str(endpoint),
+            {
+                "max_calldata_bytes": None,
+                "ceiling": None,
+                "successes": 0,
+                "latency": None,
+                "errors": 0,
+            },
+        )
+
+    def limit(self, endpoint, default):
+        with self._lock:
+            limit = self.state(endpoint)["max_calldata_bytes"]
+        return default if limit is None else limit
+
+    def clamp(self, limit):
+        return int(min(self.max_bytes, max(self.min_bytes, limit)))
+
+    def record_success(self, endpoint, size, latency, default):
+        with self._lock:
+            state = self.state(endpoint)
+            limit = state["max_calldata_bytes"] or default
+            # Exponentially weighted, only informative
+            state["latency"] = (
+                latency
+                if state["latency"] is None
+                else 0.8 * state["latency"] + 0.2 * latency
+            )
+            if state["ceiling"] is not None:
+                # Providers raise their caps, and one rejection may have been a fluke
+                state["successes"] = state.get("successes", 0) + 1
+                if state["successes"] >= self.ceiling_successes:
+                    state["ceiling"] = None
+            if latency > self.target_latency:
+                limit *= LATENCY_DECREASE
+            elif size >= limit / 2:
+                limit += INCREASE_BYTES
+                if state["ceiling"] is not None:
+                    limit = min(limit, state["ceiling"] * CEILING_MARGIN)
+            state["max_calldata_bytes"] = self.clamp(limit)
+
+    def record_error(self, endpoint, kind, size, default):
+        with self._lock:
+            state = self.state(endpoint)
+            state["errors"] += 1
+            if kind == "size":
+                if state["ceiling"] is None or size < state["ceiling"]:
+                    state["ceiling"] = size
+                state["successes"] = 0
+            if kind in ("size", "timeout"):
+                limit = min(state["max_calldata_bytes"] or default, size)
+                state["max_calldata_bytes"] = self.clamp(limit * ERROR_DECREASE)
+
+    def delay(self, attempt):
+        return self.backoff * 2**attempt
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = json.dumps(self.endpoints, indent=2, sort_keys=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
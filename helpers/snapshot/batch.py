@@ -0,0 +1,176 @@
+import time
+
+from rich.console import Console
+
+from helpers.multicall import Call, as_wei, func
+from helpers.shares_math import MAX_BPS, from_want_to_shares
+
+console = Console()
+
+
+def within(actual, expected, rounding):
+    """
+    Equal up to 1% or to one wei of rounding per operation
+    """
+    return abs(actual - expected) <= max(rounding, abs(expected) // 100)
+
+
+class SnapBatch:
+    """
+    Queues sett operations of many users, sends them back to back on exit and
+    checks them all against one snap before and one snap after
+    Usage:
+        with manager.batch() as batch:
+            for user in users:
+                batch.deposit(user, amount)
+    Only user want / sett balances are added to the snaps, so thousands of
+    users cost two multicalls rather than two snaps per operation.
+    """
+
+    def __init__(self, manager, confirm=True):
+        self.manager = manager
+        self.confirm = confirm
+        self.ops = []
+        self.users = {}
+        self.txs = []
+        self.before = None
+        self.after = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.ops:
+            self.run()
+        return False
+
+    def queue(self, op, account, amount=None):
+        address = account.address
+        if address not in self.users:
+            self.users[address] = "user{}".format(len(self.users))
+        self.ops.append((op, account, amount))
+
+    def deposit(self, account, amount):
+        self.queue("deposit", account, amount)
+
+    def depositAll(self, account):
+        self.queue("depositAll", account)
+
+    def withdraw(self, account, shares):
+        self.queue("withdraw", account, shares)
+
+    def withdrawAll(self, account):
+        self.queue("withdrawAll", account)
+
+    def user_calls(self):
+        want = self.manager.want_address
+        sett = self.manager.sett.address
+        calls = []
+        for address, key in self.users.items():
+            calls.append(
+                Call(
+                    want,
+                    [func.erc20.balanceOf, address],
+                    [["balances.want." + key, as_wei]],
+                )
+            )
+            calls.append(
+                Call(
+                    sett,
+                    [func.erc20.balanceOf, address],
+                    [["balances.sett." + key, as_wei]],
+                )
+            )
+        return calls
+
+    def snap(self):
+        manager = self.manager
+        start = time.perf_counter()
+        snapBlock = manager.block_number()
+        multi = manager.multicall(manager.snap_calls({}) + self.user_calls(), snapBlock)
+        data = multi()
+        manager.emit_snapshot(multi, data, snapBlock, start, users=len(self.users))
+        return manager.record(manager.make_snap(data, snapBlock, {}))
+
+    def send(self, op, account, amount):
+        sett = self.manager.sett
+        overrides = {"from": account}
+        if op == "deposit":
+            return sett.deposit(amount, overrides)
+        if op == "depositAll":
+            return sett.depositAll(overrides)
+        if op == "withdraw":
+            return sett.withdraw(amount, overrides)
+        return sett.withdrawAll(overrides)
+
+    def run(self):
+        self.before = self.snap()
+        self.txs = [self.send(*op) for op in self.ops]
+        self.after = self.snap()
+        if self.confirm:
+            self.verify()
+
+    def expected(self):
+        """
+        Balances the queued operations should end on, replaying the vault math
+        from the before snap
+        """
+        before = self.before
+        supply = before.get("sett.totalSupply")
+        balance = before.get("sett.balance")
+        fee_bps = before.get("sett.withdrawalFee")
+        want = {key: before.balances("want", key) for key in self.users.values()}
+        shares = {key: before.balances("sett", key) for key in self.users.values()}
+        for op, account, amount in self.ops:
+            key = self.users[account.address]
+            if op == "depositAll":
+                op, amount = "deposit", want[key]
+            elif op == "withdrawAll":
+                op, amount = "withdraw", shares[key]
+            if op == "deposit":
+                # An empty vault mints shares 1:1
+                minted = (
+                    from_want_to_shares(amount, supply, balance) if supply else amount
+                )
+                want[key] -= amount
+                shares[key] += minted
+                supply += minted
+                balance += amount
+            else:
+                value = amount * balance // supply
+                fee = value * fee_bps // MAX_BPS
+                # The fee stays in the vault, minted as shares for the treasury
+                fee_shares = fee * (supply - amount) // max(balance - value, 1)
+                want[key] += value - fee
+                shares[key] -= amount
+                supply += fee_shares - amount
+                balance -= value - fee
+        return want, shares, supply, balance
+
+    def verify(self):
+        before, after = self.before, self.after
+        rounding = len(self.ops)
+        console.print(
+            "=== Batch: {} ops, {} users, {} -> {} ===".format(
+                len(self.ops), len(self.users), before.block, after.block
+            )
+        )
+
+        # Shares only move between tracked holders or are minted / burned
+        addresses = {**self.manager.entities, **{v: k for k, v in self.users.items()}}
+        holders = {}
+        for key, address in addresses.items():
+            if "balances.sett." + key in after.data:
+                # An entity can be a batch user too, count it once
+                holders.setdefault(str(address).lower(), "balances.sett." + key)
+        holders = holders.values()
+        assert after.get("sett.totalSupply") - before.get("sett.totalSupply") == sum(
+            after.get(key) - before.get(key) for key in holders
+        )
+
+        want, shares, supply, balance = self.expected()
+        assert within(after.get("sett.totalSupply"), supply, rounding)
+        assert within(after.get("sett.balance"), balance, rounding)
+        for key in self.users.values():
+            assert within(after.balances("want", key), want[key], rounding), key
+            assert within(after.balances("sett", key), shares[key], rounding), key
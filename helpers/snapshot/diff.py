@@ -0,0 +1,122 @@
+import json
+import re
+import sys
+
+from tabulate import tabulate
+
+NONZERO = re.compile(rb"[^\x00]")
+RENDER_MODES = ("grid", "jsonl", "none")
+
+
+def changed_indexes(before, after):
+    """
+    Indexes whose value differs between two snaps packed on the same schema
+    and width, found by scanning the XOR of both columns for non-zero bytes
+    """
+    width = before.width
+    changed = set()
+    if before.column != after.column:
+        xor = (
+            int.from_bytes(before.column, "big") ^ int.from_bytes(after.column, "big")
+        ).to_bytes(len(before.column), "big")
+        changed.update(match.start() // width for match in NONZERO.finditer(xor))
+    # Non-uint values sit outside the column
+    for index in set(before.extras or ()) | set(after.extras or ()):
+        if before.value(index) != after.value(index):
+            changed.add(index)
+    return sorted(changed)
+
+
+def delta(a, b):
+    if type(a) is int and type(b) is int:
+        return b - a
+    return "-"
+
+
+class SnapDiff:
+    """
+    Keys of before whose value changed in after, as (key, before, after) rows
+    Nothing is formatted until rendered, so checks can use it for free
+    """
+
+    __slots__ = ("before", "after", "changes")
+
+    def __init__(self, before, after):
+        self.before = before
+        self.after = after
+        if before.schema is after.schema and before.width == after.width:
+            keys = before.schema.keys
+            self.changes = [
+                (keys[index], before.value(index), after.value(index))
+                for index in changed_indexes(before, after)
+            ]
+        else:
+            after_data = after.data
+            self.changes = [
+                (key, value, after_data.get(key))
+                for key, value in before.data.items()
+                if value != after_data.get(key)
+            ]
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def __contains__(self, key):
+        return any(changed == key for changed, a, b in self.changes)
+
+    def keys(self):
+        return [key for key, a, b in self.changes]
+
+    def delta(self, key):
+        for changed, a, b in self.changes:
+            if changed == key:
+                return delta(a, b)
+        return 0
+
+    def rows(self, format=None):
+        """
+        [key, before, after, diff] per change, through format(key, value) if given
+        """
+        for key, a, b in self.changes:
+            row = [key, a, b, delta(a, b)]
+            if format is not None:
+                row[1:] = [format(key, value) for value in row[1:]]
+            yield row
+
+    def render(self, mode="grid", format=None, file=None):
+        if mode not in RENDER_MODES:
+            raise Exception("Unknown diff render mode {}".format(mode))
+        if mode == "none":
+            return
+        file = file or sys.stdout
+        if mode == "jsonl":
+            # Raw integers, nothing to format
+            for key, a, b, diff in self.rows():
+                file.write(
+                    json.dumps(
+                        {
+                            "block": [self.before.block, self.after.block],
+                            "key": key,
+                            "before": a,
+                            "after": b,
+                            "diff": diff,
+                        },
+                        default=str,
+                    )
+                    + "\n"
+                )
+            return
+        print(
+            tabulate(
+                list(self.rows(format)),
+                headers=["metric", "before", "after", "diff"],
+                tablefmt="grid",
+            ),
+            file=file,
+        )
@@ -0,0 +1,113 @@
+import itertools
+import os
+import pickle
+from bisect import bisect_right, insort
+from collections import deque
+
+from helpers.snapshot.snap import get_schema
+
+MAX_SNAPS = 1_000
+
+
+class SnapHistory:
+    """
+    Bounded snap history keyed by (block, seq)
+    seq grows with every add, so two snaps of one block (or of a block reused
+    after chain.revert()) never overwrite each other. Past max_size the oldest
+    snap is evicted, or pickled into the spill directory when one is given and
+    loaded back on access.
+    """
+
+    def __init__(self, max_size=MAX_SNAPS, spill=None):
+        self.max_size = max_size
+        self.spill = spill
+        self._seq = itertools.count()
+        # Every reachable key, sorted for at_or_before
+        self._index = []
+        # Keys held in memory, oldest first
+        self._order = deque()
+        self._snaps = {}
+        self._last = None
+        if spill:
+            os.makedirs(spill, exist_ok=True)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(list(self._index))
+
+    def __contains__(self, key):
+        return self.resolve(key) is not None
+
+    def __getitem__(self, key):
+        resolved = self.resolve(key)
+        if resolved is None:
+            raise KeyError(key)
+        return self.load(resolved)
+
+    def resolve(self, key):
+        """
+        Full (block, seq) key, a bare block number means its latest snap
+        """
+        if isinstance(key, tuple):
+            position = bisect_right(self._index, key) - 1
+            if position >= 0 and self._index[position] == key:
+                return key
+            return None
+        position = bisect_right(self._index, (key, float("inf"))) - 1
+        if position >= 0 and self._index[position][0] == key:
+            return self._index[position]
+        return None
+
+    def add(self, snap):
+        key = (snap.block, next(self._seq))
+        insort(self._index, key)
+        self._order.append(key)
+        self._snaps[key] = snap
+        self._last = key
+        while len(self._order) > self.max_size:
+            self.evict(self._order.popleft())
+        return key
+
+    def evict(self, key):
+        snap = self._snaps.pop(key)
+        if self.spill:
+            with open(self.spill_path(key), "wb") as f:
+                pickle.dump(snap, f)
+        else:
+            del self._index[bisect_right(self._index, key) - 1]
+
+    def spill_path(self, key):
+        return os.path.join(self.spill, "{}-{}.snap".format(*key))
+
+    def load(self, key):
+        if key in self._snaps:
+            return self._snaps[key]
+        with open(self.spill_path(key), "rb") as f:
+            snap = pickle.load(f)
+        # Share the interned schema again rather than the unpickled copy
+        snap.schema = get_schema(snap.schema.keys)
+        return snap
+
+    def latest(self):
+        return None if self._last is None else self.load(self._last)
+
+    def at_or_before(self, block):
+        """
+        Latest snap taken at block or the closest block before it
+        """
+        position = bisect_right(self._index, (block, float("inf"))) - 1
+        if position < 0:
+            return None
+        return self.load(self._index[position])
+
+    def clear(self):
+        if self.spill:
+            for key in self._index:
+                if key not in self._snaps and os.path.exists(self.spill_path(key)):
+                    os.remove(self.spill_path(key))
+        self._index = []
+        self._order = deque()
+        self._snaps = {}
+        self._last = None
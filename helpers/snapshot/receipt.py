@@ -0,0 +1,66 @@
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from helpers.multicall.functions import as_wei, func
+
+TRANSFER_TOPIC = keccak(text="Transfer(address,address,uint256)")
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+def derivable_keys(calls):
+    """
+    Snap keys that follow from ERC20 Transfer logs alone
+    Returns ({(token, holder): key} for balanceOf, {token: key} for totalSupply),
+    addresses lower-cased. Only calls whose value is the raw uint qualify.
+    """
+    balances = {}
+    supplies = {}
+    for call in calls:
+        if not call.uint256_key or call.uint256_key[1] not in (None, as_wei):
+            continue
+        key = call.uint256_key[0]
+        if call.function == func.erc20.balanceOf:
+            balances[(call.target.lower(), str(call.args[0]).lower())] = key
+        elif call.function == func.erc20.totalSupply:
+            supplies[call.target.lower()] = key
+    return balances, supplies
+
+
+def transfers(logs):
+    """
+    (token, from, to, amount) of each ERC20 Transfer log, in log order
+    ERC721 Transfers (tokenId indexed, 4 topics) are skipped
+    """
+    for log in logs:
+        topics = log["topics"]
+        if len(topics) != 3 or HexBytes(topics[0]) != TRANSFER_TOPIC:
+            continue
+        data = HexBytes(log["data"])
+        if len(data) != 32:
+            continue
+        yield (
+            log["address"].lower(),
+            "0x" + bytes(HexBytes(topics[1])[-20:]).hex(),
+            "0x" + bytes(HexBytes(topics[2])[-20:]).hex(),
+            int.from_bytes(data, "big"),
+        )
+
+
+def apply_transfers(before, logs, balances, supplies):
+    """
+    Values of the derivable keys after the logs, starting from the before snap
+    Read through before.data so a lazy snap doesn't count them as checked
+    """
+    values = {key: before.data[key] for key in balances.values()}
+    values.update({key: before.data[key] for key in supplies.values()})
+    for token, sender, receiver, amount in transfers(logs):
+        if (token, sender) in balances:
+            values[balances[(token, sender)]] -= amount
+        if (token, receiver) in balances:
+            values[balances[(token, receiver)]] += amount
+        if token in supplies:
+            if sender == ZERO_ADDRESS:
+                values[supplies[token]] += amount
+            if receiver == ZERO_ADDRESS:
+                values[supplies[token]] -= amount
+    return values
@@ -1,23 +1,192 @@
+from collections.abc import Mapping
+from weakref import WeakValueDictionary
+
+## Column widths in bytes, a snap packs its uints at the narrowest that fits them all
+WIDTHS = (8, 16, 32)
+## Distinct entity key lists kept for interning, oldest ones are forgotten first
+MAX_ENTITY_KEYS = 1024
+
+
+class SnapSchema:
+    """
+    Key order shared by every Snap of the same call plan, see get_schema
+    """
+
+    __slots__ = ("keys", "index", "__weakref__")
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.index = {key: index for index, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+
+## A schema lives as long as a snap uses it, so one-off key sets (batch users,
+## lazily fetched keys, sweep subsets) don't pile up in long-running loops
+_schemas = WeakValueDictionary()
+_entity_keys = {}
+
+
+def get_schema(keys):
+    """
+    Interned schema, thousands of snaps of one plan hold a single copy of its keys
+    """
+    keys = tuple(keys)
+    schema = _schemas.get(keys)
+    if schema is None:
+        schema = _schemas.setdefault(keys, SnapSchema(keys))
+    return schema
+
+
+def intern_keys(keys):
+    keys = tuple(keys)
+    interned = _entity_keys.get(keys)
+    if interned is None:
+        # Tuples can't be weakly referenced, bound the table instead
+        if len(_entity_keys) >= MAX_ENTITY_KEYS:
+            del _entity_keys[next(iter(_entity_keys))]
+        interned = _entity_keys.setdefault(keys, keys)
+    return interned
+
+
+def is_word(value):
+    # bool is an int subclass, keep it as is
+    return type(value) is int and 0 <= value < 2**256
+
+
+def pack(values):
+    """
+    (column, width, extras) for a list of values in schema order
+    uints share one fixed-width big-endian column, anything else (addresses,
+    bools, Failures) sits in extras by index with a zero word in the column
+    """
+    extras = {}
+    bits = 0
+    for index, value in enumerate(values):
+        if is_word(value):
+            bits = max(bits, value.bit_length())
+        else:
+            extras[index] = value
+    width = next(width for width in WIDTHS if bits <= width * 8)
+    column = b"".join(
+        (0 if index in extras else value).to_bytes(width, "big")
+        for index, value in enumerate(values)
+    )
+    return column, width, extras or None
+
+
+class SnapData(Mapping):
+    """
+    Read-only {key: value} view of a Snap, values are unpacked on access
+    """
+
+    __slots__ = ("snap",)
+
+    def __init__(self, snap):
+        self.snap = snap
+
+    def __getitem__(self, key):
+        return self.snap.value(self.snap.schema.index[key])
+
+    def __iter__(self):
+        return iter(self.snap.schema.keys)
+
+    def __len__(self):
+        return len(self.snap.schema)
+
+    def __contains__(self, key):
+        return key in self.snap.schema.index
+
+
 class Snap:
-    def __init__(self, data, block, entityKeys):
-        self.data = data
+    """
+    Values of one snapshot packed in a single column, keys live in a shared
+    SnapSchema. snap.data is a read-only mapping view over them.
+    When reads is a set, keys read through get/balances/shares are added to it,
+    and a fetch(key) callback fills in keys the snap was taken without.
+    """
+
+    __slots__ = (
+        "schema",
+        "column",
+        "width",
+        "extras",
+        "block",
+        "entityKeys",
+        "reads",
+        "fetch",
+    )
+
+    def __init__(self, data, block, entityKeys, reads=None, fetch=None):
+        self.schema = get_schema(data.keys())
         self.block = block
-        self.entityKeys = entityKeys
+        self.entityKeys = intern_keys(entityKeys)
+        self.column, self.width, self.extras = pack(list(data.values()))
+        self.reads = reads
+        self.fetch = fetch
+
+    def __getstate__(self):
+        # The fetch callback is bound to a live manager, leave it out
+        return (
+            self.schema,
+            self.column,
+            self.width,
+            self.extras,
+            self.block,
+            self.entityKeys,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.schema,
+            self.column,
+            self.width,
+            self.extras,
+            self.block,
+            self.entityKeys,
+        ) = state
+        self.reads = None
+        self.fetch = None
+
+    @property
+    def data(self):
+        return SnapData(self)
+
+    def value(self, index):
+        if self.extras and index in self.extras:
+            return self.extras[index]
+        start = index * self.width
+        return int.from_bytes(self.column[start : start + self.width], "big")
+
+    def values(self):
+        return [self.value(index) for index in range(len(self.schema))]
 
     # ===== Getters =====
 
     def balances(self, tokenKey, accountKey):
-        return self.data["balances." + tokenKey + "." + accountKey]
+        return self.get("balances." + tokenKey + "." + accountKey)
 
     def shares(self, tokenKey, accountKey):
-        return self.data["shares." + tokenKey + "." + accountKey]
+        return self.get("shares." + tokenKey + "." + accountKey)
 
     def get(self, key):
-        if key not in self.data.keys():
-            raise Exception("Key {} not found in snap data".format(key))
-        return self.data[key]
+        if key not in self.schema.index:
+            if self.fetch is None:
+                raise Exception("Key {} not found in snap data".format(key))
+            self.set(key, self.fetch(key))
+        if self.reads is not None:
+            self.reads.add(key)
+        return self.value(self.schema.index[key])
 
     # ===== Setters =====
 
     def set(self, key, value):
-        self.data[key] = value
+        values = self.values()
+        if key in self.schema.index:
+            values[self.schema.index[key]] = value
+        else:
+            # Snaps sharing the old schema are left untouched
+            self.schema = get_schema(self.schema.keys + (key,))
+            values.append(value)
+        self.column, self.width, self.extras = pack(values)
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+
+from helpers.snapshot.snap import Snap
+
+
+def encode_value(value):
+    if value is None:
+        return "none", None
+    if isinstance(value, bool):
+        return "bool", "1" if value else "0"
+    if isinstance(value, int):
+        # uint256 doesn't fit sqlite's INTEGER
+        return "int", str(value)
+    if isinstance(value, str):
+        return "str", value
+    # Failures and decoded tuples are kept for reading, not for comparing
+    return "repr", repr(value)
+
+
+def decode_value(kind, value):
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        return value == "1"
+    if kind == "none":
+        return None
+    return value
+
+
+class SnapStore:
+    """
+    Snaps persisted in a local sqlite file, one row per (vault, block, seq, metric)
+    Reopen the file after a failed run to inspect its snaps without the chain:
+        store = SnapStore("snaps.sqlite")
+        store.series("StrategySnapshot", "sett.getPricePerFullShare", start, end)
+    seq is the store's write order, so reruns against a reset chain never
+    overwrite earlier snaps of the same block.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snaps "
+            "(vault TEXT, block INTEGER, seq INTEGER, entity_keys TEXT, created REAL, "
+            "PRIMARY KEY (vault, block, seq)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snap_values "
+            "(vault TEXT, block INTEGER, seq INTEGER, metric TEXT, position INTEGER, "
+            "kind TEXT, value TEXT, "
+            "PRIMARY KEY (vault, block, seq, metric)) WITHOUT ROWID"
+        )
+        # Per-metric range scans (series) across blocks
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS snap_values_metric "
+            "ON snap_values (vault, metric, block, seq)"
+        )
+        self._db.commit()
+        (seq,) = self._db.execute("SELECT MAX(seq) FROM snaps").fetchone()
+        self._seq = -1 if seq is None else seq
+
+    def add(self, vault, snap):
+        """
+        Write a snap, returns its (block, seq) key
+        """
+        with self._lock:
+            self._seq += 1
+            key = (snap.block, self._seq)
+            self._db.execute(
+                "INSERT INTO snaps VALUES (?, ?, ?, ?, ?)",
+                (vault, *key, json.dumps(list(snap.entityKeys)), time.time()),
+            )
+            self._db.executemany(
+                "INSERT INTO snap_values VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (vault, *key, metric, position, *encode_value(value))
+                    for position, (metric, value) in enumerate(snap.data.items())
+                ],
+            )
+            self._db.commit()
+        return key
+
+    def keys(self, vault, start=None, end=None):
+        """
+        (block, seq) of the vault's snaps with start <= block <= end
+        """
+        query = "SELECT block, seq FROM snaps WHERE vault = ?"
+        params = [vault]
+        if start is not None:
+            query += " AND block >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND block <= ?"
+            params.append(end)
+        with self._lock:
+            return self._db.execute(query + " ORDER BY block, seq", params).fetchall()
+
+    def load(self, vault, block, seq):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT entity_keys FROM snaps WHERE vault = ? AND block = ? AND seq = ?",
+                (vault, block, seq),
+            ).fetchone()
+            if row is None:
+                raise KeyError((vault, block, seq))
+            values = self._db.execute(
+                "SELECT metric, kind, value FROM snap_values "
+                "WHERE vault = ? AND block = ? AND seq = ? ORDER BY position",
+                (vault, block, seq),
+            ).fetchall()
+        data = {metric: decode_value(kind, value) for metric, kind, value in values}
+        return Snap(data, block, json.loads(row[0]))
+
+    def snaps(self, vault, start=None, end=None):
+        return [self.load(vault, *key) for key in self.keys(vault, start, end)]
+
+    def at_or_before(self, vault, block):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT block, seq FROM snaps WHERE vault = ? AND block <= ? "
+                "ORDER BY block DESC, seq DESC LIMIT 1",
+                (vault, block),
+            ).fetchone()
+        return None if row is None else self.load(vault, *row)
+
+    def latest(self, vault):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT block, seq FROM snaps WHERE vault = ? ORDER BY seq DESC LIMIT 1",
+                (vault,),
+            ).fetchone()
+        return None if row is None else self.load(vault, *row)
+
+    def series(self, vault, metric, start=None, end=None):
+        """
+        [(block, seq, value)] of one metric over a block range
+        """
+        query = (
+            "SELECT block, seq, kind, value FROM snap_values "
+            "WHERE vault = ? AND metric = ?"
+        )
+        params = [vault, metric]
+        if start is not None:
+            query += " AND block >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND block <= ?"
+            params.append(end)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY block, seq", params).fetchall()
+        return [
+            (block, seq, decode_value(kind, value)) for block, seq, kind, value in rows
+        ]
+
+    def vaults(self):
+        with self._lock:
+            return [
+                vault
+                for (vault,) in self._db.execute("SELECT DISTINCT vault FROM snaps")
+            ]
+
+    def close(self):
+        self._db.close()
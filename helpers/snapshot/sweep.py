@@ -0,0 +1,73 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.multicall import Multicall
+
+MAX_WORKERS = 8
+
+
+def call_keys(calls):
+    keys = []
+    for call in calls:
+        for name, handler in call.returns or []:
+            if name not in keys:
+                keys.append(name)
+    return keys
+
+
+class SnapSweep:
+    """
+    Runs one call plan at every block of a range, streaming columnar rows
+    Iterating yields [block, value for each key in columns] in block order,
+    with at most max_workers blocks in flight at once.
+    Needs a node that serves historical state (archive node or local fork).
+    """
+
+    def __init__(
+        self, calls, blocks, keys=None, max_workers=MAX_WORKERS, **multicall_kwargs
+    ):
+        if keys is not None:
+            wanted = set(keys)
+            calls = [
+                call
+                for call in calls
+                if any(name in wanted for name, handler in call.returns or [])
+            ]
+        self.calls = calls
+        self.blocks = blocks
+        self.keys = list(keys) if keys is not None else call_keys(calls)
+        self.columns = ["block"] + self.keys
+        self.max_workers = max_workers
+        self.multicall_kwargs = multicall_kwargs
+
+    def fetch(self, block):
+        # Blocks already run in parallel, so each multicall sends its chunks in turn
+        data = Multicall(
+            self.calls, block_identifier=block, max_workers=1, **self.multicall_kwargs
+        )()
+        return [block] + [data.get(key) for key in self.keys]
+
+    def __iter__(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            try:
+                for block in self.blocks:
+                    pending.append(executor.submit(self.fetch, block))
+                    if len(pending) >= 2 * self.max_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Consumer stopped early, don't fetch blocks nobody will read
+                for future in pending:
+                    future.cancel()
+
+    def columnar(self):
+        """
+        Whole sweep as {column: [values]}
+        """
+        table = {column: [] for column in self.columns}
+        for row in self:
+            for column, value in zip(self.columns, row):
+                table[column].append(value)
+        return table
@@ -0,0 +1,53 @@
+from brownie import history as brownie_history
+
+from helpers.multicall import Multicall
+
+
+class Wiring:
+    """
+    Contract addresses and ids a strategy is wired with, read once and cached
+    stages are functions of the values read so far returning the next Calls,
+    so dependent reads (e.g. booster.poolInfo(pid)) take one multicall each.
+    The cache is dropped once a watched setter ({address: {fn_name}}) shows up
+    in brownie's transaction history, as the strategy setters emit no events,
+    or on invalidate(). Pass history=[] where transactions don't go through
+    brownie (e.g. InProcessTransport) and invalidate() after setter calls.
+    """
+
+    def __init__(self, stages, setters, transport=None, history=None):
+        self.stages = stages
+        self.setters = {
+            address.lower(): set(names) for address, names in setters.items()
+        }
+        self.transport = transport
+        self.history = brownie_history if history is None else history
+        self.values = None
+        # Position in history up to which transactions were checked
+        self.seen = len(self.history)
+
+    def invalidate(self):
+        self.values = None
+
+    def stale(self):
+        history = self.history
+        if len(history) < self.seen:
+            # History was cleared or reset with the chain, anything could have changed
+            self.seen = len(history)
+            return True
+        txs = history[self.seen :]
+        self.seen = len(history)
+        return any(
+            tx.receiver is not None
+            and tx.fn_name in self.setters.get(tx.receiver.lower(), ())
+            for tx in txs
+        )
+
+    def get(self):
+        if self.stale():
+            self.invalidate()
+        if self.values is None:
+            values = {}
+            for stage in self.stages:
+                values.update(Multicall(stage(values), transport=self.transport)())
+            self.values = values
+        return self.values
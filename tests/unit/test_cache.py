@@ -0,0 +1,70 @@
+from helpers.multicall import cache as cache_module
+from helpers.multicall.cache import ResponseCache
+
+TARGET = "0x" + "11" * 20
+
+
+def key(block, calldata=b"\x70\xa0\x82\x31"):
+    return (1, block, TARGET, calldata)
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_size=2)
+    cache.set(key(1), True, b"\x01")
+    cache.set(key(2), True, b"\x02")
+    ## Reading block 1 makes block 2 the least recently used
+    assert cache.get(key(1)) == (True, b"\x01")
+
+    cache.set(key(3), True, b"\x03")
+
+    assert len(cache) == 2
+    assert key(2) not in cache
+    assert cache.get(key(1)) == (True, b"\x01")
+    assert cache.get(key(3)) == (True, b"\x03")
+
+
+def test_age_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ResponseCache(max_age=60)
+    cache.set(key(1), True, b"\x01")
+
+    now[0] += 30
+    assert cache.get(key(1)) == (True, b"\x01")
+    now[0] += 31
+    assert cache.get(key(1)) is None
+    assert len(cache) == 0
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_sqlite_reload(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path=path)
+    cache.set(key(1), True, b"\x01" * 32)
+    cache.set(key(2), False, b"")
+    cache.close()
+
+    reloaded = ResponseCache(path=path)
+
+    assert len(reloaded) == 2
+    assert reloaded.get(key(1)) == (True, b"\x01" * 32)
+    assert reloaded.get(key(2)) == (False, b"")
+
+
+def test_sqlite_reload_drops_expired_and_excess(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path=path)
+    for block in range(4):
+        cache.set(key(block), True, bytes([block]))
+        now[0] += 10
+    cache.close()
+
+    ## Blocks 0 and 1 are too old, block 2 is past max_size
+    reloaded = ResponseCache(max_size=1, max_age=25, path=path)
+
+    assert len(reloaded) == 1
+    assert reloaded.get(key(3)) == (True, b"\x03")
+    reloaded.close()
+    assert len(ResponseCache(path=path)) == 1
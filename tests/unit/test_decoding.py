@@ -0,0 +1,86 @@
+import pytest
+
+try:
+    from eth_abi import decode, encode
+except ImportError:
+    ## eth-abi < 3, as pinned by older brownie releases
+    from eth_abi import decode_abi as decode, encode_abi as encode
+
+from helpers.multicall.decoding import decode_aggregate, decode_results
+
+
+def test_decode_aggregate_uniform():
+    ## Every element one word long, the uint256 getter case
+    returnData = [(index * 10**18).to_bytes(32, "big") for index in range(50)]
+    output = encode(["uint256", "bytes[]"], [12345, returnData])
+
+    block, outputs = decode_aggregate(output)
+
+    expected_block, expected = decode(["uint256", "bytes[]"], output)
+    assert block == expected_block
+    assert [bytes(view) for view in outputs] == list(expected)
+
+
+def test_decode_aggregate_non_uniform():
+    returnData = [
+        (1).to_bytes(32, "big"),
+        b"",
+        encode(["string"], ["Badger Sett"]),
+        bytes(range(7)),
+        encode(["address", "uint256"], ["0x" + "ab" * 20, 2**255]),
+    ]
+    output = encode(["uint256", "bytes[]"], [1, returnData])
+
+    block, outputs = decode_aggregate(output)
+
+    expected_block, expected = decode(["uint256", "bytes[]"], output)
+    assert block == expected_block
+    assert [bytes(view) for view in outputs] == list(expected)
+
+
+def test_decode_aggregate_empty():
+    output = encode(["uint256", "bytes[]"], [7, []])
+
+    assert decode_aggregate(output) == (7, [])
+
+
+def test_decode_results():
+    results = [
+        (True, (42).to_bytes(32, "big")),
+        (False, b""),
+        (False, bytes.fromhex("08c379a0") + encode(["string"], ["reverted"])),
+        (True, encode(["string"], ["wBTC"])),
+    ]
+    output = encode(["(bool,bytes)[]"], [results])
+
+    decoded = [(success, bytes(view)) for success, view in decode_results(output)]
+
+    assert decoded == list(decode(["(bool,bytes)[]"], output)[0])
+
+
+@pytest.mark.parametrize("decoder", [decode_aggregate, decode_results])
+def test_empty_response(decoder):
+    with pytest.raises(ValueError):
+        decoder(b"")
+    with pytest.raises(ValueError):
+        decoder(b"\x00" * 63)
+
+
+def test_truncated_response():
+    output = encode(["uint256", "bytes[]"], [1, [(1).to_bytes(32, "big")] * 3])
+    results = encode(["(bool,bytes)[]"], [[(True, (1).to_bytes(32, "big"))] * 3])
+
+    for cut in (32, 64, 96, len(output) - 32):
+        with pytest.raises(ValueError):
+            decode_aggregate(output[:cut])
+    for cut in (32, 64, 96, len(results) - 32):
+        with pytest.raises(ValueError):
+            decode_results(results[:cut])
+
+
+def test_offsets_past_the_response():
+    ## Array offset, then array length, pointing past the end
+    with pytest.raises(ValueError):
+        decode_aggregate((1).to_bytes(32, "big") + (2**64).to_bytes(32, "big"))
+    with pytest.raises(ValueError):
+        decode_results((32).to_bytes(32, "big") + (2**64).to_bytes(32, "big"))
@@ -0,0 +1,54 @@
+from helpers.snapshot.diff import SnapDiff
+from helpers.snapshot.snap import Snap
+
+ADDRESS = "0x" + "ab" * 20
+
+
+def snap_data(**overrides):
+    data = {
+        "sett.totalSupply": 10**24,
+        "sett.balance": 2**200,
+        "balances.want.user": 0,
+        "sett.governance": ADDRESS,
+        "strategy.isTendable": True,
+    }
+    data.update(overrides)
+    return data
+
+
+def naive_diff(before, after):
+    return [
+        (key, value, after.data.get(key))
+        for key, value in before.data.items()
+        if value != after.data.get(key)
+    ]
+
+
+def test_diff_matches_key_walk():
+    before = Snap(snap_data(), 1, [])
+    after = Snap(
+        snap_data(
+            **{
+                "sett.totalSupply": 10**24 + 1,
+                "balances.want.user": 5,
+                "strategy.isTendable": False,
+            }
+        ),
+        2,
+        [],
+    )
+
+    diff = SnapDiff(before, after)
+
+    assert diff.changes == naive_diff(before, after)
+    assert diff.delta("balances.want.user") == 5
+    assert diff.delta("sett.balance") == 0
+
+
+def test_diff_across_widths_and_schemas():
+    before = Snap({"a": 1, "b": 2}, 1, [])
+    wider = Snap({"a": 1, "b": 2**100}, 2, [])
+    other = Snap({"b": 2, "a": 3}, 3, [])
+
+    assert SnapDiff(before, wider).changes == [("b", 2, 2**100)]
+    assert SnapDiff(before, other).changes == naive_diff(before, other)
@@ -0,0 +1,56 @@
+from helpers.snapshot.history import SnapHistory
+from helpers.snapshot.snap import Snap
+
+
+def snap(block, supply):
+    return Snap({"sett.totalSupply": supply}, block, ["sett"])
+
+
+def test_eviction():
+    history = SnapHistory(max_size=2)
+    for block in (10, 11, 12):
+        history.add(snap(block, block))
+
+    assert len(history) == 2
+    assert 10 not in history
+    assert history[11].get("sett.totalSupply") == 11
+    assert history.latest().block == 12
+
+
+def test_spill(tmp_path):
+    history = SnapHistory(max_size=2, spill=str(tmp_path))
+    keys = [history.add(snap(block, block * 10**18)) for block in (10, 11, 12)]
+
+    ## The oldest snap went to disk and is loaded back on access
+    assert len(history) == 3
+    assert len(list(tmp_path.iterdir())) == 1
+    spilled = history[keys[0]]
+    assert spilled.block == 10
+    assert spilled.get("sett.totalSupply") == 10 * 10**18
+    assert spilled.schema is history[keys[1]].schema
+
+    history.clear()
+    assert len(history) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_same_block_twice():
+    history = SnapHistory()
+    first = history.add(snap(10, 1))
+    second = history.add(snap(10, 2))
+
+    assert first != second
+    assert history[first].get("sett.totalSupply") == 1
+    ## A bare block number reads its latest snap
+    assert history[10].get("sett.totalSupply") == 2
+
+
+def test_at_or_before():
+    history = SnapHistory()
+    for block in (10, 20, 30):
+        history.add(snap(block, block))
+
+    assert history.at_or_before(9) is None
+    assert history.at_or_before(10).block == 10
+    assert history.at_or_before(25).block == 20
+    assert history.at_or_before(10**9).block == 30
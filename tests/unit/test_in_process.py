@@ -0,0 +1,69 @@
+import pytest
+from brownie.project import compile_source
+
+from helpers.StrategyCoreResolver import StrategyCoreResolver
+from helpers.multicall import Call, Multicall, as_wei, func
+from helpers.multicall.transport import InProcessTransport
+from helpers.snapshot.diff import SnapDiff
+from helpers.snapshot.snap import Snap
+
+## InProcessTransport needs eth-tester[py-evm]
+pytest.importorskip("eth_tester")
+
+TOKEN_SOURCE = """
+pragma solidity 0.6.12;
+
+contract Token {
+    mapping(address => uint256) public balanceOf;
+    uint256 public totalSupply;
+
+    event Transfer(address indexed from, address indexed to, uint256 value);
+
+    constructor(uint256 supply) public {
+        balanceOf[msg.sender] = supply;
+        totalSupply = supply;
+        emit Transfer(address(0), msg.sender, supply);
+    }
+
+    function transfer(address to, uint256 value) external returns (bool) {
+        balanceOf[msg.sender] -= value;
+        balanceOf[to] += value;
+        emit Transfer(msg.sender, to, value);
+        return true;
+    }
+}
+"""
+
+
+def snap(transport, token, entities):
+    ## Same call building as a SnapshotManager plan, on a plain address
+    calls = StrategyCoreResolver(None).add_entity_balances_for_tokens(
+        [], "want", token, entities
+    )
+    calls.append(Call(token, [func.erc20.totalSupply], [["want.totalSupply", as_wei]]))
+    data = Multicall(calls, transport=transport)()
+    return Snap(data, transport.block_number(), list(entities.keys()))
+
+
+def test_snap_in_process():
+    container = compile_source(TOKEN_SOURCE).Token
+    transport = InProcessTransport()
+    holder, user = transport.accounts[:2]
+    token = transport.deploy_container(container, 1000, sender=holder)
+    entities = {"holder": holder, "user": user}
+
+    before = snap(transport, token, entities)
+    transport.w3.eth.contract(address=token, abi=container.abi).functions.transfer(
+        user, 250
+    ).transact({"from": holder})
+    after = snap(transport, token, entities)
+
+    assert before.balances("want", "holder") == 1000
+    assert before.balances("want", "user") == 0
+    assert after.balances("want", "holder") == 750
+    assert after.balances("want", "user") == 250
+    assert after.block == before.block + 1
+
+    diff = SnapDiff(before, after)
+    assert diff.keys() == ["balances.want.holder", "balances.want.user"]
+    assert diff.delta("balances.want.user") == 250
@@ -0,0 +1,193 @@
+import pytest
+from eth_utils import to_checksum_address
+
+try:
+    from eth_abi import decode, encode
+except ImportError:
+    ## eth-abi < 3, as pinned by older brownie releases
+    from eth_abi import decode_abi as decode, encode_abi as encode
+
+from helpers.multicall import Call, Failure, Multicall, func
+from helpers.multicall.constants import MULTICALL3_ADDRESS
+from helpers.multicall.multicall import calldata_size, chunk_calls, dedupe_calls
+
+TOKEN = to_checksum_address("0x" + "11" * 20)
+BROKEN = to_checksum_address("0x" + "ee" * 20)
+REVERTS = to_checksum_address("0x" + "dd" * 20)
+REVERT_DATA = bytes.fromhex("08c379a0") + encode(["string"], ["nope"])
+
+
+def balance_calls(count):
+    return [
+        Call(TOKEN, [func.erc20.balanceOf, "0x%040x" % index], [[str(index), None]])
+        for index in range(count)
+    ]
+
+
+def test_chunk_calls_by_calldata():
+    calls = balance_calls(10)
+    size = calldata_size(calls[0])
+
+    chunks = chunk_calls(calls, 3 * size, 10**9)
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    assert [call for chunk in chunks for call in chunk] == calls
+
+
+def test_chunk_calls_by_gas():
+    chunks = chunk_calls(balance_calls(10), 10**9, 100, gas_per_call=25)
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+
+def test_chunk_calls_oversized_call():
+    ## A call bigger than the limit still goes out, alone in its chunk
+    chunks = chunk_calls(balance_calls(3), 1, 10**9)
+
+    assert [len(chunk) for chunk in chunks] == [1, 1, 1]
+
+
+def test_chunk_calls_empty():
+    assert chunk_calls([], 1000, 1000) == []
+
+
+class FakeTransport:
+    """
+    Runs aggregate3 over balanceOf(address) reads, BROKEN fails the whole
+    aggregate (think out of gas) and REVERTS fails like a plain revert
+    """
+
+    def __init__(self, error=None, response=None):
+        self.error = error
+        self.response = response
+        self.requests = 0
+
+    def chain_id(self):
+        return 1
+
+    def block_number(self):
+        return 100
+
+    def has_code(self, address):
+        return address == MULTICALL3_ADDRESS
+
+    def execute(self, target, data):
+        if target == BROKEN:
+            raise ValueError("execution reverted: out of gas")
+        if target == REVERTS:
+            return False, REVERT_DATA
+        (owner,) = decode(["address"], bytes(data)[4:])
+        return True, encode(["uint256"], [int(owner, 16) % 1000])
+
+    def eth_call(self, tx, block_identifier=None, state_override=None):
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+        if self.response is not None:
+            return self.response
+        (items,) = decode(["(address,bool,bytes)[]"], bytes(tx["data"])[4:])
+        results = []
+        for target, allow_failure, data in items:
+            success, output = self.execute(to_checksum_address(target), data)
+            if not success and not allow_failure:
+                raise ValueError("execution reverted")
+            results.append((success, output))
+        return encode(["(bool,bytes)[]"], [results])
+
+
+def test_bisect_isolates_failing_call():
+    calls = balance_calls(8)
+    calls[5] = Call(BROKEN, [func.erc20.balanceOf, TOKEN], [["5", None]])
+    transport = FakeTransport()
+
+    result = Multicall(
+        calls, require_success=False, max_workers=1, transport=transport
+    )()
+
+    assert isinstance(result["5"], Failure)
+    assert "out of gas" in result["5"].reason
+    assert {key: value for key, value in result.items() if key != "5"} == {
+        str(index): index for index in range(8) if index != 5
+    }
+    assert transport.requests > 1
+
+
+def test_revert_is_a_failure():
+    calls = balance_calls(3) + [
+        Call(REVERTS, [func.erc20.balanceOf, TOKEN], [["reverts", None]])
+    ]
+    transport = FakeTransport()
+
+    result = Multicall(calls, require_success=False, transport=transport)()
+
+    assert result["reverts"].reason == REVERT_DATA
+    assert not result["reverts"]
+    assert [result[str(index)] for index in range(3)] == [0, 1, 2]
+    assert transport.requests == 1
+
+
+def test_connection_error_is_not_bisected():
+    transport = FakeTransport(error=ConnectionError("connection refused"))
+
+    with pytest.raises(ConnectionError):
+        Multicall(balance_calls(4), require_success=False, transport=transport)()
+
+    assert transport.requests == 1
+
+
+def test_failure_without_returns_keys_on_function():
+    call = Call(REVERTS, [func.erc20.balanceOf, TOKEN], allow_failure=True)
+
+    result = Multicall([call], transport=FakeTransport())()
+
+    assert list(result) == [func.erc20.balanceOf]
+    assert isinstance(result[func.erc20.balanceOf], Failure)
+
+
+def test_required_call_failure_includes_output():
+    call = Call(REVERTS, [func.erc20.balanceOf, TOKEN], [["reverts", None]])
+    multicall = Multicall([call], transport=FakeTransport())
+
+    with pytest.raises(Exception, match="0x" + REVERT_DATA.hex()):
+        multicall.decode(call, False, memoryview(REVERT_DATA))
+    with pytest.raises(Exception, match="execution reverted"):
+        multicall.decode(call, False, "execution reverted")
+
+
+def test_result_count_must_match_calls():
+    ## A node answering without running the aggregate
+    transport = FakeTransport(response=encode(["(bool,bytes)[]"], [[]]))
+
+    with pytest.raises(ValueError, match="0 results for 3 calls"):
+        Multicall(balance_calls(3), transport=transport)()
+
+
+def test_dedupe_calls_fanout():
+    first, second = balance_calls(2)
+    same_call = Call(
+        first.target, [func.erc20.balanceOf, first.args[0]], [["copy", None]]
+    )
+    tolerant = Call(
+        first.target, [func.erc20.balanceOf, first.args[0]], [["t", None]], True
+    )
+
+    unique, fanout = dedupe_calls([first, second, same_call, tolerant])
+
+    ## allow_failure changes how a call is sent, so it isn't folded
+    assert unique == [first, second, tolerant]
+    assert fanout == [0, 1, 0, 2]
+
+
+def test_duplicates_read_one_response():
+    calls = balance_calls(3)
+    calls.append(
+        Call(TOKEN, [func.erc20.balanceOf, calls[1].args[0]], [["copy", None]])
+    )
+    transport = FakeTransport()
+
+    multicall = Multicall(calls, transport=transport)
+    result = multicall()
+
+    assert result == {"0": 0, "1": 1, "2": 2, "copy": 1}
+    assert multicall.removed == 1
+    assert multicall.metrics["unique_calls"] == 3
@@ -0,0 +1,59 @@
+from eth_utils import to_checksum_address
+
+from helpers.multicall import Call, CallPlan, func
+
+TOKEN = "0x" + "11" * 20
+SETT = "0x" + "22" * 20
+USER = to_checksum_address("0x" + "ab" * 20)
+OTHER = to_checksum_address("0x" + "cd" * 20)
+
+
+def build(slots):
+    calls = [
+        Call(TOKEN, [func.erc20.totalSupply], [["token.totalSupply", None]]),
+        Call(SETT, [func.erc20.balanceOf, SETT], [["balances.sett.sett", None]]),
+    ]
+    for key, address in slots.items():
+        calls.append(
+            Call(TOKEN, [func.erc20.balanceOf, address], [["balances." + key, None]])
+        )
+        calls.append(
+            Call(
+                TOKEN,
+                ["allowance(address,address)(uint256)", address, SETT],
+                [["allowance." + key, None]],
+            )
+        )
+    return calls
+
+
+def test_bind_matches_fresh_encoding():
+    plan = CallPlan(build, ("user", "other"))
+    binding = {"user": USER, "other": OTHER}
+
+    bound = plan.bind(binding)
+    fresh = build(binding)
+
+    assert [call.target for call in bound] == [call.target for call in fresh]
+    assert [call.args for call in bound] == [call.args for call in fresh]
+    assert [bytes(call.data) for call in bound] == [bytes(call.data) for call in fresh]
+
+
+def test_bind_leaves_out_unbound_slots():
+    plan = CallPlan(build, ("user", "other"))
+
+    bound = plan.bind({"user": USER})
+
+    assert [bytes(call.data) for call in bound] == [
+        bytes(call.data) for call in build({"user": USER})
+    ]
+
+
+def test_bind_does_not_touch_the_plan():
+    plan = CallPlan(build, ("user",))
+    template = [bytes(call.data) for call in plan.calls]
+
+    plan.bind({"user": USER})
+    plan.bind({"user": OTHER})
+
+    assert [bytes(call.data) for call in plan.calls] == template
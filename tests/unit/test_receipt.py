@@ -0,0 +1,126 @@
+from eth_utils import to_checksum_address
+
+from helpers.multicall import Call, func
+from helpers.snapshot.receipt import (
+    TRANSFER_TOPIC,
+    apply_transfers,
+    derivable_keys,
+)
+from helpers.snapshot.snap import Snap
+
+WANT = to_checksum_address("0x" + "11" * 20)
+SETT = to_checksum_address("0x" + "22" * 20)
+USER = to_checksum_address("0x" + "ab" * 20)
+STRATEGY = to_checksum_address("0x" + "cd" * 20)
+ZERO = "0x" + "00" * 20
+
+
+def topic(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+def transfer_log(token, sender, receiver, amount):
+    return {
+        "address": token,
+        "topics": [TRANSFER_TOPIC, topic(sender), topic(receiver)],
+        "data": amount.to_bytes(32, "big"),
+    }
+
+
+def calls():
+    return [
+        Call(WANT, [func.erc20.balanceOf, USER], [["balances.want.user", None]]),
+        Call(WANT, [func.erc20.balanceOf, SETT], [["balances.want.sett", None]]),
+        Call(SETT, [func.erc20.balanceOf, USER], [["balances.sett.user", None]]),
+        Call(SETT, [func.erc20.totalSupply], [["sett.totalSupply", None]]),
+        Call(SETT, ["getPricePerFullShare()(uint256)"], [["sett.ppfs", None]]),
+    ]
+
+
+def test_derivable_keys():
+    balances, supplies = derivable_keys(calls())
+
+    assert balances == {
+        (WANT.lower(), USER.lower()): "balances.want.user",
+        (WANT.lower(), SETT.lower()): "balances.want.sett",
+        (SETT.lower(), USER.lower()): "balances.sett.user",
+    }
+    assert supplies == {SETT.lower(): "sett.totalSupply"}
+
+
+def test_apply_transfers_deposit():
+    before = Snap(
+        {
+            "balances.want.user": 1000,
+            "balances.want.sett": 50,
+            "balances.sett.user": 0,
+            "sett.totalSupply": 500,
+            "sett.ppfs": 10**18,
+        },
+        1,
+        [],
+    )
+    logs = [
+        # Deposit: want in, shares minted
+        transfer_log(WANT, USER, SETT, 400),
+        transfer_log(SETT, ZERO, USER, 380),
+        # Earn: want to an untracked strategy
+        transfer_log(WANT, SETT, STRATEGY, 450),
+        # ERC721 Transfer, tokenId indexed
+        {**transfer_log(SETT, ZERO, USER, 0), "topics": [TRANSFER_TOPIC] * 4},
+    ]
+
+    values = apply_transfers(before, logs, *derivable_keys(calls()))
+
+    assert values == {
+        "balances.want.user": 600,
+        "balances.want.sett": 0,
+        "balances.sett.user": 380,
+        "sett.totalSupply": 880,
+    }
+
+
+def test_apply_transfers_burn():
+    before = Snap(
+        {
+            "balances.want.user": 0,
+            "balances.want.sett": 100,
+            "balances.sett.user": 100,
+            "sett.totalSupply": 100,
+        },
+        1,
+        [],
+    )
+    logs = [
+        transfer_log(SETT, USER, ZERO, 100),
+        transfer_log(WANT, SETT, USER, 100),
+    ]
+
+    values = apply_transfers(before, logs, *derivable_keys(calls()))
+
+    assert values["balances.sett.user"] == 0
+    assert values["sett.totalSupply"] == 0
+    assert values["balances.want.user"] == 100
+
+
+def test_apply_transfers_leaves_reads_alone():
+    ## A lazy snap learns the keys an operation's checks read, deriving the
+    ## next snap isn't one of them
+    reads = set()
+    before = Snap(
+        {
+            "balances.want.user": 100,
+            "balances.want.sett": 0,
+            "balances.sett.user": 0,
+            "sett.totalSupply": 0,
+        },
+        1,
+        [],
+        reads=reads,
+    )
+
+    apply_transfers(
+        before, [transfer_log(WANT, USER, SETT, 100)], *derivable_keys(calls())
+    )
+
+    assert reads == set()
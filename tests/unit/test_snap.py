@@ -0,0 +1,47 @@
+from helpers.multicall import Call, Failure
+from helpers.snapshot.snap import Snap
+
+ADDRESS = "0x" + "ab" * 20
+
+
+def snap_data(**overrides):
+    data = {
+        "sett.totalSupply": 10**24,
+        "sett.balance": 2**200,
+        "sett.withdrawalFee": 10,
+        "balances.want.user": 0,
+        "sett.governance": ADDRESS,
+        "strategy.isTendable": True,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_pack_round_trip():
+    data = snap_data()
+    data["strategy.pool"] = Failure(Call(ADDRESS, "pool()(address)"), "reverted")
+
+    snap = Snap(data, 1, ["sett"])
+
+    assert dict(snap.data) == data
+    assert snap.get("sett.balance") == 2**200
+    assert type(snap.get("strategy.isTendable")) is bool
+
+
+def test_pack_narrowest_width():
+    assert Snap({"a": 1, "b": 2**64 - 1}, 1, []).width == 8
+    assert Snap({"a": 1, "b": 2**64}, 1, []).width == 16
+    assert Snap({"a": 2**255}, 1, []).width == 32
+
+
+def test_set_keeps_shared_schema():
+    a = Snap(snap_data(), 1, [])
+    b = Snap(snap_data(), 2, [])
+    assert a.schema is b.schema
+
+    b.set("sett.balance", 1)
+    b.set("sett.keeper", ADDRESS)
+
+    assert a.get("sett.balance") == 2**200
+    assert "sett.keeper" not in a.data
+    assert b.get("sett.keeper") == ADDRESS
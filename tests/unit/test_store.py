@@ -0,0 +1,58 @@
+from helpers.multicall import Call, Failure
+from helpers.snapshot.snap import Snap
+from helpers.snapshot.store import SnapStore
+
+VAULT = "StrategySnapshot"
+ADDRESS = "0x" + "ab" * 20
+
+
+def snap(block, ppfs):
+    return Snap(
+        {
+            "sett.getPricePerFullShare": ppfs,
+            "sett.balance": 2**200,
+            "sett.governance": ADDRESS,
+            "strategy.isTendable": True,
+            "strategy.pool": Failure(Call(ADDRESS, "pool()(address)"), "reverted"),
+        },
+        block,
+        ["sett", "strategy"],
+    )
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / "snaps.sqlite")
+    store = SnapStore(path)
+    first = store.add(VAULT, snap(10, 10**18))
+    store.close()
+
+    store = SnapStore(path)
+    ## seq carries on from the reopened file
+    second = store.add(VAULT, snap(10, 2 * 10**18))
+
+    assert first[1] < second[1]
+    assert store.keys(VAULT) == [first, second]
+    assert store.vaults() == [VAULT]
+    loaded = store.load(VAULT, *first)
+    assert loaded.block == 10
+    assert loaded.entityKeys == ("sett", "strategy")
+    assert loaded.get("sett.getPricePerFullShare") == 10**18
+    assert loaded.get("sett.balance") == 2**200
+    assert loaded.get("strategy.isTendable") is True
+    assert loaded.get("strategy.pool").startswith("Failure(")
+    assert store.latest(VAULT).get("sett.getPricePerFullShare") == 2 * 10**18
+
+
+def test_series(tmp_path):
+    store = SnapStore(str(tmp_path / "snaps.sqlite"))
+    for block in (10, 20, 30):
+        store.add(VAULT, snap(block, block * 10**16))
+    store.add("OtherVault", snap(20, 1))
+
+    assert store.series(VAULT, "sett.getPricePerFullShare", 15, 30) == [
+        (20, 1, 20 * 10**16),
+        (30, 2, 30 * 10**16),
+    ]
+    assert [s.block for s in store.snaps(VAULT, end=20)] == [10, 20]
+    assert store.at_or_before(VAULT, 25).block == 20
+    assert store.at_or_before(VAULT, 5) is None
@@ -0,0 +1,52 @@
+import threading
+
+from helpers.multicall import Call, func
+from helpers.snapshot.sweep import SnapSweep
+
+TOKEN = "0x" + "11" * 20
+
+
+class BlockTransport:
+    """
+    Answers totalSupply() with the block number, holding every block after
+    the first until released, like a slow archive node
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.blocks = []
+
+    def chain_id(self):
+        return 1
+
+    def has_code(self, address):
+        return False
+
+    def batch_call(self, txs, block_identifier=None, state_override=None):
+        if block_identifier > 1:
+            self.release.wait(5)
+        self.blocks.append(block_identifier)
+        return [(True, block_identifier.to_bytes(32, "big")) for tx in txs]
+
+
+def test_sweep_rows():
+    transport = BlockTransport()
+    transport.release.set()
+    calls = [Call(TOKEN, [func.erc20.totalSupply], [["supply", None]])]
+
+    sweep = SnapSweep(calls, range(1, 6), max_workers=2, transport=transport)
+
+    assert list(sweep) == [[block, block] for block in range(1, 6)]
+
+
+def test_sweep_cancels_pending_blocks():
+    transport = BlockTransport()
+    calls = [Call(TOKEN, [func.erc20.totalSupply], [["supply", None]])]
+    rows = iter(SnapSweep(calls, range(1, 101), max_workers=2, transport=transport))
+
+    assert next(rows) == [1, 1]
+    ## Blocks 2 and 3 are on the node, block 4 is queued behind them
+    threading.Timer(0.1, transport.release.set).start()
+    rows.close()
+
+    assert set(transport.blocks) <= {1, 2, 3}
@@ -0,0 +1,56 @@
+from helpers.multicall.transport import JSONRPCTransport, parse_batch
+
+AGGREGATOR = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+class FakeNode(JSONRPCTransport):
+    """
+    One endpoint that switches chains, like brownie moving between networks
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chain = 1
+        self.deployed = {1: {AGGREGATOR}, 1337: set()}
+        self.lookups = 0
+
+    def chain_id(self):
+        return self.chain
+
+    def post(self, payload):
+        assert payload["method"] == "eth_getCode"
+        self.lookups += 1
+        address = payload["params"][0]
+        code = "0x6080" if address in self.deployed[self.chain] else "0x"
+        return {"jsonrpc": "2.0", "id": payload["id"], "result": code}
+
+
+def test_has_code_per_chain():
+    node = FakeNode()
+
+    assert node.has_code(AGGREGATOR)
+    assert node.has_code(AGGREGATOR)
+    assert node.lookups == 1
+
+    node.chain = 1337
+    assert not node.has_code(AGGREGATOR)
+    node.chain = 1
+    assert node.has_code(AGGREGATOR)
+    assert node.lookups == 2
+
+
+def test_parse_batch_matches_ids():
+    node = FakeNode()
+    payload = node.batch_payload(
+        [{"to": AGGREGATOR, "data": b"\x01"}, {"to": AGGREGATOR, "data": b"\x02"}]
+    )
+    first, second = (request["id"] for request in payload)
+    responses = [
+        {"id": second, "error": {"message": "execution reverted"}},
+        {"id": first, "result": "0x2a"},
+    ]
+
+    assert parse_batch(payload, responses) == [
+        (True, b"\x2a"),
+        (False, str({"message": "execution reverted"})),
+    ]
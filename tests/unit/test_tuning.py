@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from helpers.multicall import Call, ChunkTuner, Multicall, func
+from helpers.multicall.tuning import classify_error
+
+ENDPOINT = "http://localhost:8545"
+TOKEN = "0x" + "11" * 20
+
+
+class OutOfGas:
+    """
+    Node on which the one call of the plan always runs out of gas
+    """
+
+    endpoint_uri = ENDPOINT
+
+    def __init__(self):
+        self.requests = 0
+
+    def chain_id(self):
+        return 1
+
+    def has_code(self, address):
+        return True
+
+    def eth_call(self, tx, block_identifier=None, state_override=None):
+        self.requests += 1
+        raise ValueError("execution reverted: out of gas")
+
+
+def test_classify_error():
+    out_of_gas = ValueError("out of gas")
+
+    assert classify_error(out_of_gas, 10) == "size"
+    assert classify_error(out_of_gas, 1) is None
+    assert classify_error(ValueError("execution reverted"), 10) is None
+    assert classify_error(asyncio.TimeoutError(), 1) == "timeout"
+    assert classify_error(ValueError("Read timed out"), 10) == "timeout"
+    assert classify_error(ValueError("429 Too Many Requests"), 1) == "transient"
+
+
+def test_single_call_out_of_gas_is_not_retried():
+    transport = OutOfGas()
+    tuner = ChunkTuner()
+    call = Call(TOKEN, [func.erc20.totalSupply], [["supply", None]])
+
+    with pytest.raises(ValueError, match="out of gas"):
+        Multicall([call], transport=transport, tuner=tuner)()
+
+    assert transport.requests == 1
+    assert tuner.state(ENDPOINT)["ceiling"] is None
+
+
+def test_timeout_cuts_without_ceiling():
+    tuner = ChunkTuner()
+
+    tuner.record_error(ENDPOINT, "timeout", 40_000, 64_000)
+
+    assert tuner.limit(ENDPOINT, 64_000) == 20_000
+    assert tuner.state(ENDPOINT)["ceiling"] is None
+
+
+def test_ceiling_expires_after_successes():
+    tuner = ChunkTuner(ceiling_successes=3)
+    tuner.record_error(ENDPOINT, "size", 40_000, 64_000)
+    assert tuner.state(ENDPOINT)["ceiling"] == 40_000
+
+    for _ in range(2):
+        tuner.record_success(ENDPOINT, 20_000, 0.1, 64_000)
+    assert tuner.state(ENDPOINT)["ceiling"] == 40_000
+    tuner.record_success(ENDPOINT, 20_000, 0.1, 64_000)
+
+    assert tuner.state(ENDPOINT)["ceiling"] is None
+
+
+def test_save_and_reload(tmp_path):
+    path = str(tmp_path / "tuner.json")
+    tuner = ChunkTuner(path)
+    tuner.record_error(ENDPOINT, "size", 40_000, 64_000)
+    tuner.record_success(ENDPOINT, 20_000, 0.5, 64_000)
+    tuner.save()
+
+    reloaded = ChunkTuner(path)
+
+    assert reloaded.endpoints == tuner.endpoints
+    assert reloaded.limit(ENDPOINT, 64_000) == tuner.limit(ENDPOINT, 64_000)
@@ -0,0 +1,78 @@
+from eth_utils import to_checksum_address
+
+from helpers.multicall import Call
+from helpers.snapshot.wiring import Wiring
+
+STRATEGY = "0x" + "57" * 20
+SETT = "0x" + "5e" * 20
+POOL = "0x" + "b0" * 20
+
+
+class Tx:
+    def __init__(self, receiver, fn_name):
+        self.receiver = receiver
+        self.fn_name = fn_name
+
+
+class PoolTransport:
+    """
+    Answers pool()(address) through plain eth_calls, counting them
+    """
+
+    def __init__(self):
+        self.reads = 0
+
+    def chain_id(self):
+        return 1
+
+    def has_code(self, address):
+        return False
+
+    def batch_call(self, txs, block_identifier=None, state_override=None):
+        self.reads += len(txs)
+        return [(True, bytes(12) + bytes.fromhex(POOL[2:])) for tx in txs]
+
+
+def wiring(history, transport=None):
+    stages = [lambda values: [Call(STRATEGY, "pool()(address)", [["pool", None]])]]
+    setters = {STRATEGY: ["setPool"], to_checksum_address(SETT): ["setGovernance"]}
+    return Wiring(stages, setters, transport=transport, history=history)
+
+
+def test_stale_on_watched_setter():
+    history = [Tx(STRATEGY, "setPool")]
+    cached = wiring(history)
+
+    ## Transactions before the wiring was read don't count
+    assert not cached.stale()
+    history.append(Tx(STRATEGY, "harvest"))
+    history.append(Tx(SETT, "setPool"))
+    history.append(Tx(None, "constructor"))
+    assert not cached.stale()
+    history.append(Tx(SETT, "setGovernance"))
+    assert cached.stale()
+    assert not cached.stale()
+
+
+def test_stale_on_history_reset():
+    history = [Tx(STRATEGY, "harvest"), Tx(STRATEGY, "harvest")]
+    cached = wiring(history)
+
+    del history[:]
+
+    assert cached.stale()
+    assert not cached.stale()
+
+
+def test_get_rereads_after_setter():
+    history = []
+    transport = PoolTransport()
+    cached = wiring(history, transport)
+
+    assert cached.get()["pool"].lower() == POOL
+    cached.get()
+    assert transport.reads == 1
+
+    history.append(Tx(to_checksum_address(STRATEGY), "setPool"))
+    cached.get()
+    assert transport.reads == 2